@@ -1,9 +1,12 @@
 """Debugger scenario 1."""
 import sys
+import os
 from pathlib import Path
 
 repo_directory = Path(__file__).parents[3].resolve()
 sys.path.append(str(repo_directory))
+# scenarios are always run from scratch, not resumed from checkpoints
+os.environ["AGENT_CHECKPOINTS"] = "off"
 from dotenv import find_dotenv, load_dotenv
 
 from src.agents.debugger_agent import Debugger
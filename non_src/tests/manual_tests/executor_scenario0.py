@@ -1,8 +1,11 @@
 import pathlib
 import sys
+import os
 
 repo_directory = pathlib.Path(__file__).parents[3].resolve()
 sys.path.append(str(repo_directory))
+# scenarios are always run from scratch, not resumed from checkpoints
+os.environ["AGENT_CHECKPOINTS"] = "off"
 from src.agents.executor_agent import Executor
 from non_src.tests.manual_tests.utils_for_tests import cleanup_work_dir
 
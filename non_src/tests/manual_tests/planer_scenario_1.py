@@ -1,8 +1,11 @@
 import pathlib
 import sys
+import os
 
 repo_directory = pathlib.Path(__file__).parents[3].resolve()
 sys.path.append(str(repo_directory))
+# scenarios are always run from scratch, not resumed from checkpoints
+os.environ["AGENT_CHECKPOINTS"] = "off"
 
 from dotenv import find_dotenv, load_dotenv
 
@@ -0,0 +1,21 @@
+"""Unit tests run in temporary work dir, as modules read WORK_DIR env variable when imported."""
+
+import os
+import pathlib
+import shutil
+import tempfile
+
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix="clean_coder_unit_tests_")
+os.environ["WORK_DIR"] = WORK_DIR
+
+
+@pytest.fixture
+def work_dir() -> pathlib.Path:
+    """Empty work dir with .clean_coder folder, shared by modules which read WORK_DIR on import."""
+    path = pathlib.Path(WORK_DIR)
+    shutil.rmtree(path)
+    (path / ".clean_coder" / "files_and_folders_descriptions").mkdir(parents=True)
+    (path / ".clean_coder" / ".coderignore").touch()
+    return path
@@ -0,0 +1,130 @@
+"""Unit tests for SQLite checkpoints of agent graphs and resuming interrupted agents."""
+
+import operator
+import pathlib
+import sqlite3
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, StateGraph
+
+from src.utilities import checkpointer as checkpointer_module
+from src.utilities.checkpointer import SqliteCheckpointSaver, resume_task, run_graph, thread_config
+
+TASK = "Add login page"
+
+
+class State(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+class Agent:
+    """Graph of three nodes; failing node raises, as crash or Ctrl+C would interrupt it."""
+
+    def __init__(self, checkpointer: SqliteCheckpointSaver, failing_node: str | None = None) -> None:
+        self.failing_node = failing_node
+        self.calls = []
+        workflow = StateGraph(State)
+        for node in ("plan", "edit", "test"):
+            workflow.add_node(node, self.node(node))
+        workflow.set_entry_point("plan")
+        workflow.add_edge("plan", "edit")
+        workflow.add_edge("edit", "test")
+        workflow.add_edge("test", END)
+        self.graph = workflow.compile(checkpointer=checkpointer)
+
+    def node(self, name: str):
+        def call(state: State) -> dict:
+            self.calls.append(name)
+            if name == self.failing_node:
+                raise KeyboardInterrupt
+            return {"steps": [name]}
+        return call
+
+
+@pytest.fixture
+def checkpointer(tmp_path: pathlib.Path) -> SqliteCheckpointSaver:
+    return SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"))
+
+
+@pytest.fixture(autouse=True)
+def no_resumed_tasks(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Every test starts with no task resumed by user."""
+    monkeypatch.setattr(checkpointer_module, "_resumed_tasks", set())
+
+
+def test_interrupted_agent_resumes_from_last_completed_node(tmp_path: pathlib.Path) -> None:
+    """Test that agent interrupted in the middle resumes in new process without repeating completed nodes."""
+    # Given agent interrupted at its second node
+    path = str(tmp_path / "checkpoints.sqlite")
+    interrupted = Agent(SqliteCheckpointSaver(path), failing_node="edit")
+    with pytest.raises(KeyboardInterrupt):
+        run_graph(interrupted.graph, {"steps": []}, TASK, "Executor", 50)
+    # When the same task is resumed with new checkpointer instance, as after restart
+    resume_task(TASK)
+    resumed = Agent(SqliteCheckpointSaver(path))
+    state = run_graph(resumed.graph, {"steps": []}, TASK, "Executor", 50)
+    # Then only not completed nodes are run
+    assert resumed.calls == ["edit", "test"]
+    assert state["steps"] == ["plan", "edit", "test"]
+
+
+def test_finished_agent_result_is_reused(checkpointer: SqliteCheckpointSaver) -> None:
+    """Test that agent which already finished the task is not run again."""
+    # Given agent which finished the task
+    run_graph(Agent(checkpointer).graph, {"steps": []}, TASK, "Executor", 50)
+    # When the same task is resumed
+    resume_task(TASK)
+    agent = Agent(checkpointer)
+    state = run_graph(agent.graph, {"steps": []}, TASK, "Executor", 50)
+    # Then saved result is returned without running nodes
+    assert agent.calls == []
+    assert state["steps"] == ["plan", "edit", "test"]
+
+
+def test_saved_progress_is_discarded_if_task_not_resumed(checkpointer: SqliteCheckpointSaver) -> None:
+    """Test that progress saved before is not reused unless user decided to resume task."""
+    # Given agent which finished the task
+    run_graph(Agent(checkpointer).graph, {"steps": []}, TASK, "Executor", 50)
+    # When the same task is run again without resuming it
+    agent = Agent(checkpointer)
+    state = run_graph(agent.graph, {"steps": []}, TASK, "Executor", 50)
+    # Then agent runs from scratch, and state of previous run is not mixed in
+    assert agent.calls == ["plan", "edit", "test"]
+    assert state["steps"] == ["plan", "edit", "test"]
+
+
+def test_not_kept_thread_is_removed_after_finish(checkpointer: SqliteCheckpointSaver) -> None:
+    """Test that with keep_finished=False agent runs again from scratch next time."""
+    # Given agent which finished the task without keeping its checkpoints
+    run_graph(Agent(checkpointer).graph, {"steps": []}, TASK, "File Answerer", 50, keep_finished=False)
+    # When the same task is run again
+    agent = Agent(checkpointer)
+    run_graph(agent.graph, {"steps": []}, TASK, "File Answerer", 50, keep_finished=False)
+    # Then all nodes are run again
+    assert agent.calls == ["plan", "edit", "test"]
+
+
+def test_only_latest_checkpoints_are_kept(checkpointer: SqliteCheckpointSaver) -> None:
+    """Test that old checkpoints of thread are removed, so database does not grow with every step."""
+    # When agent runs through several nodes
+    run_graph(Agent(checkpointer).graph, {"steps": []}, TASK, "Executor", 50)
+    # Then only the latest checkpoints of its thread are stored
+    connection = sqlite3.connect(checkpointer.path)
+    checkpoints_count = connection.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+    assert checkpoints_count == 2
+
+
+def test_delete_threads_removes_only_matching_threads(checkpointer: SqliteCheckpointSaver) -> None:
+    """Test that removing checkpoints of one task keeps checkpoints of other tasks."""
+    # Given finished agents of two tasks
+    run_graph(Agent(checkpointer).graph, {"steps": []}, "task_1", "Executor", 50)
+    run_graph(Agent(checkpointer).graph, {"steps": []}, "task_2", "Executor", 50)
+    task_1_thread = thread_config("task_1", "Executor")["configurable"]["thread_id"]
+    task_2_thread = thread_config("task_2", "Executor")["configurable"]["thread_id"]
+    # When checkpoints of first task are removed, and of prefix being sql wildcard, matching no thread literally
+    checkpointer.delete_threads(task_1_thread.replace(":Executor", ":"))
+    checkpointer.delete_threads("_")
+    # Then only second task stays checkpointed
+    assert checkpointer.get_tuple({"configurable": {"thread_id": task_1_thread}}) is None
+    assert checkpointer.get_tuple({"configurable": {"thread_id": task_2_thread}}) is not None
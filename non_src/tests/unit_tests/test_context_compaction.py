@@ -0,0 +1,117 @@
+"""Unit tests for token-aware compaction of agent conversations."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from src.utilities import context_compaction
+from src.utilities.context_compaction import SUMMARY_HEADER, ContextCompactor, is_summary
+
+
+class FakeSummarizer:
+    """Mini LLM returning numbered summaries and remembering prompts it got."""
+
+    def __init__(self) -> None:
+        self.prompts = []
+
+    def invoke(self, messages: list) -> AIMessage:
+        self.prompts.append(messages[0].content)
+        return AIMessage(content=f"summary {len(self.prompts)}")
+
+
+@pytest.fixture
+def summarizer(monkeypatch: pytest.MonkeyPatch) -> FakeSummarizer:
+    fake_summarizer = FakeSummarizer()
+    monkeypatch.setattr(context_compaction, "summarizer", fake_summarizer)
+    return fake_summarizer
+
+
+def tool_turn(nr: int, size: int = 400) -> list:
+    """AI message calling two tools and their results."""
+    return [
+        AIMessage(content=f"turn {nr} " + "x" * size, tool_calls=[
+            {"name": "see_file", "args": {"filename": f"a{nr}.py"}, "id": f"call_{nr}_a"},
+            {"name": "see_file", "args": {"filename": f"b{nr}.py"}, "id": f"call_{nr}_b"},
+        ]),
+        ToolMessage(content="y" * size, tool_call_id=f"call_{nr}_a"),
+        ToolMessage(content="y" * size, tool_call_id=f"call_{nr}_b"),
+    ]
+
+
+def conversation(turns: int) -> list:
+    head = [SystemMessage(content="system"), HumanMessage(content="task")]
+    pinned = [HumanMessage(content="file contents", contains_file_contents=True)]
+    return head + pinned + [message for nr in range(turns) for message in tool_turn(nr)]
+
+
+def assert_tool_calls_paired(messages: list) -> None:
+    """Every tool result follows AI message calling it, and every tool call has its result."""
+    called_ids = set()
+    result_ids = set()
+    for message in messages:
+        if message.type == "ai":
+            called_ids.update(tool_call["id"] for tool_call in message.tool_calls)
+        elif message.type == "tool":
+            assert message.tool_call_id in called_ids
+            result_ids.add(message.tool_call_id)
+    assert called_ids == result_ids
+
+
+def test_units_keep_tool_results_with_their_call() -> None:
+    """Test that AI message and its tool results form one unit, while head and pinned messages are not removable."""
+    # Given conversation with head, pinned message and two tool turns
+    messages = conversation(2)
+    # When it is split into units
+    units = ContextCompactor(token_budget=1000).units(messages)
+    # Then every unit is AI message with its tool results
+    assert units == [[3, 4, 5], [6, 7, 8]]
+
+
+def test_conversation_fitting_budget_is_unchanged(summarizer: FakeSummarizer) -> None:
+    """Test that conversation below budget is not compacted."""
+    messages = conversation(2)
+    assert ContextCompactor(token_budget=100000).compact(messages) == messages
+    assert summarizer.prompts == []
+
+
+def test_compaction_replaces_oldest_turns_with_summary(summarizer: FakeSummarizer) -> None:
+    """Test that oldest turns are summarized, while head, pinned message and newest turns are kept."""
+    # Given conversation above budget
+    messages = conversation(10)
+    compactor = ContextCompactor(token_budget=2000)
+    # When it is compacted
+    compacted = compactor.compact(messages)
+    # Then it fits the budget, keeps head, pinned message and newest turn, and summary replaces removed turns
+    assert sum(compactor.tokens(message) for message in compacted) <= 2000
+    assert compacted[:3] == messages[:3]
+    assert compacted[-3:] == messages[-3:]
+    summaries = [message for message in compacted if is_summary(message)]
+    assert [summary.content for summary in summaries] == [SUMMARY_HEADER + "summary 1"]
+    assert compacted.index(summaries[0]) == 3
+    assert_tool_calls_paired(compacted)
+
+
+def test_summary_is_rolling(summarizer: FakeSummarizer) -> None:
+    """Test that next compaction passes previous summary to summarizer and keeps one summary only."""
+    # Given conversation compacted once
+    compactor = ContextCompactor(token_budget=2000)
+    messages = compactor.compact(conversation(10))
+    # When it grows above budget again and is compacted
+    messages = compactor.compact(messages + [message for nr in range(10, 16) for message in tool_turn(nr)])
+    # Then previous summary is included in new one
+    assert "summary 1" in summarizer.prompts[1]
+    assert [message.content for message in messages if is_summary(message)] == [SUMMARY_HEADER + "summary 2"]
+    assert_tool_calls_paired(messages)
+
+
+def test_pinned_messages_above_budget_are_not_summarized_every_turn(summarizer: FakeSummarizer) -> None:
+    """Test that compaction is skipped when messages which can't be removed alone exceed budget."""
+    # Given conversation which pinned file contents alone exceed budget
+    compactor = ContextCompactor(token_budget=2000)
+    messages = conversation(0)
+    messages[2] = HumanMessage(content="z" * 20000, contains_file_contents=True)
+    # When conversation grows turn after turn
+    for nr in range(5):
+        messages = compactor.compact(messages + tool_turn(nr))
+    # Then nothing is summarized or removed
+    assert summarizer.prompts == []
+    assert len(messages) == 3 + 5 * 3
@@ -0,0 +1,93 @@
+"""Unit tests for read-only tools started while LLM response is streamed."""
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.tools import tool
+
+from src.utilities.langgraph_common_functions import EarlyToolCalls, call_model, call_tool
+
+
+class FakeStreamingLLM:
+    """LLM streaming tool calls chunk by chunk; failing one raises after streaming them."""
+
+    def __init__(self, tool_calls: list, failing: bool = False) -> None:
+        self.bound = self
+        self.tool_calls = tool_calls
+        self.failing = failing
+
+    def stream(self, messages: list):
+        for index, tool_call in enumerate(self.tool_calls):
+            yield AIMessageChunk(content="", tool_call_chunks=[{
+                "name": tool_call["name"], "args": tool_call["args"], "id": tool_call["id"], "index": index,
+            }])
+        if self.failing:
+            raise ConnectionError("stream broken")
+
+
+@pytest.fixture
+def see_file_calls() -> list:
+    """Tool which remembers files it was called for."""
+    return []
+
+
+@pytest.fixture
+def tools(see_file_calls: list) -> list:
+    @tool
+    def see_file(filename: str) -> str:
+        """Shows file."""
+        see_file_calls.append(filename)
+        return f"contents of {filename}"
+    return [see_file]
+
+
+@pytest.fixture(autouse=True)
+def streaming(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_STREAMING", "on")
+    EarlyToolCalls.discard_pending()
+
+
+def see_file_call(nr: int, filename: str) -> dict:
+    return {"name": "see_file", "args": f'{{"filename": "{filename}"}}', "id": f"call_{nr}"}
+
+
+def test_early_result_is_used_by_call_tool(tools: list, see_file_calls: list) -> None:
+    """Test that tool started during streaming is not run again by call_tool, and nothing stays pending after."""
+    # Given response streamed with two read-only tool calls
+    llm = FakeStreamingLLM([see_file_call(1, "a.py"), see_file_call(2, "b.py")])
+    state = call_model({"messages": [HumanMessage(content="task")]}, [llm], tools=tools)
+    # When its tool calls are executed
+    state = call_tool(state, tools)
+    # Then every tool ran once and registry of early calls is consumed
+    assert sorted(see_file_calls) == ["a.py", "b.py"]
+    assert [message.content for message in state["messages"][2:]] == ["contents of a.py", "contents of b.py"]
+    assert EarlyToolCalls.take_pending() is None
+
+
+def test_calls_of_failed_stream_are_discarded(tools: list) -> None:
+    """Test that tools started for stream which failed are not taken for response of next LLM."""
+    # Given first LLM failing after streaming tool calls, and next one calling the same id with other args
+    failing_llm = FakeStreamingLLM(
+        [see_file_call(1, "a.py"), see_file_call(2, "b.py"), see_file_call(3, "c.py")], failing=True
+    )
+    next_llm = FakeStreamingLLM([see_file_call(1, "d.py"), see_file_call(4, "e.py")])
+    # When model is called
+    state = call_model({"messages": [HumanMessage(content="task")]}, [failing_llm, next_llm], tools=tools)
+    # Then only call of successful response is pending, and call_tool uses its result
+    early_calls = EarlyToolCalls.pending.calls
+    assert list(early_calls.started) == ["call_1"]
+    state = call_tool(state, tools)
+    assert [message.content for message in state["messages"][2:]] == ["contents of d.py", "contents of e.py"]
+
+
+def test_calls_dropped_from_final_message_are_discarded(tools: list) -> None:
+    """Test that early calls which agent removed from final message are not left registered."""
+    # Given streamed response which tool calls were filtered out by agent
+    llm = FakeStreamingLLM([see_file_call(1, "a.py"), see_file_call(2, "b.py")])
+    state = call_model({"messages": [HumanMessage(content="task")]}, [llm], tools=tools)
+    early_calls = EarlyToolCalls.pending.calls
+    state["messages"][-1] = AIMessage(content="", tool_calls=[])
+    # When tool calls are executed
+    call_tool(state, tools)
+    # Then started calls are dropped
+    assert early_calls.started == {}
+    assert EarlyToolCalls.take_pending() is None
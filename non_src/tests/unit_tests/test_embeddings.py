@@ -0,0 +1,67 @@
+"""Unit tests for embedding cache and checking embedding backend of indexed collection."""
+
+import pathlib
+import sqlite3
+
+import pytest
+
+from src.tools.rag import embeddings
+from src.tools.rag.embeddings import EmbeddingCache, check_embedding_backend
+
+
+class FakeCollection:
+    """Collection with metadata saved on creation, as Chroma collection has."""
+
+    def __init__(self, metadata: dict | None) -> None:
+        self.name = "file_descriptions"
+        self.metadata = metadata
+
+
+@pytest.fixture(autouse=True)
+def hashing_backend(work_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setattr(embeddings, "_embedding_functions", {})
+    monkeypatch.setattr(embeddings, "_reported_mismatches", set())
+
+
+def test_cache_evicts_least_recently_used(work_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that cache above size limit keeps recently used embeddings only."""
+    # Given cache limited to two embeddings, with first one used after second one was added
+    monkeypatch.setattr(embeddings, "MAX_CACHED_EMBEDDINGS", 2)
+    cache = EmbeddingCache(str(work_dir / ".clean_coder" / "embedding_cache.sqlite"))
+    cache.put_many("hashing:512", ["a"], [[1.0]])
+    cache.put_many("hashing:512", ["b"], [[2.0]])
+    monkeypatch.setattr(embeddings.time, "time", lambda: 2e9)
+    cache.get_many("hashing:512", ["a"])
+    # When third embedding is added
+    cache.put_many("hashing:512", ["c"], [[3.0]])
+    # Then least recently used one is evicted
+    assert cache.get_many("hashing:512", ["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+
+
+def test_cache_created_before_eviction_is_migrated(work_dir: pathlib.Path) -> None:
+    """Test that cache written without usage times keeps its embeddings."""
+    # Given cache saved in old format
+    path = str(work_dir / ".clean_coder" / "embedding_cache.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE embeddings (backend TEXT, text_hash TEXT, vector BLOB, PRIMARY KEY (backend, text_hash))"
+    )
+    connection.execute("INSERT INTO embeddings VALUES (?, ?, ?)", ("hashing:512", "a", b"\x00\x00\x80?"))
+    connection.commit()
+    connection.close()
+    # When it is opened
+    cache = EmbeddingCache(path)
+    # Then old embeddings are found
+    assert cache.get_many("hashing:512", ["a"]) == {"a": [1.0]}
+
+
+@pytest.mark.parametrize(("metadata", "matches"), [
+    ({"embedding_backend": "hashing:512"}, True),
+    ({"embedding_backend": "openai:text-embedding-3-small"}, False),
+    # collections created before backends been introduced used Chroma's default model
+    (None, False),
+])
+def test_collection_of_other_backend_is_not_queried(metadata: dict | None, matches: bool) -> None:
+    """Test that collection indexed with other embedding backend than configured one is refused."""
+    assert check_embedding_backend(FakeCollection(metadata)) == matches
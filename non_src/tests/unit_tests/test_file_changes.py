@@ -0,0 +1,72 @@
+"""Unit tests for diff-based refresh of file contents shown to agents."""
+
+import pathlib
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.utilities.objects import CodeFile
+from src.utilities.util_functions import describe_file_changes, exchange_file_contents
+
+
+def test_replaced_lines_described_with_new_numbers() -> None:
+    """Test that replaced and inserted lines are shown with their new line numbers and shift of next lines."""
+    # Given file with one line replaced by two
+    old_snapshot = {"app.py": ["a = 1\n", "b = 2\n", "c = 3\n"]}
+    new_snapshot = {"app.py": ["a = 1\n", "b = 20\n", "b2 = 21\n", "c = 3\n"]}
+    # When changes are described
+    changes = describe_file_changes(old_snapshot, new_snapshot)
+    # Then new content of changed lines is shown with new numbers
+    assert changes == (
+        "app.py:\n\nOld lines 2-2 replaced with lines 2-3: (next lines moved by +1)\n2|b = 20 |2\n3|b2 = 21 |3\n"
+    )
+
+
+def test_new_removed_and_unchanged_files() -> None:
+    """Test that new file is shown whole, removed file is reported, and unchanged file is skipped."""
+    # Given snapshots with new, removed and unchanged file
+    old_snapshot = {"same.py": ["x = 1\n"], "removed.py": ["y = 1\n"]}
+    new_snapshot = {"same.py": ["x = 1\n"], "removed.py": None, "new.py": ["z = 1\n"]}
+    # When changes are described
+    changes = describe_file_changes(old_snapshot, new_snapshot)
+    # Then only new and removed files are described
+    assert changes == "removed.py: File not exists.\n\n###\n\nnew.py (new file):\n\n1|z = 1 |1\n"
+
+
+def test_no_changes() -> None:
+    """Test that nothing is described when files did not change."""
+    snapshot = {"app.py": ["a = 1\n"]}
+    assert describe_file_changes(snapshot, dict(snapshot)) == ""
+
+
+@pytest.mark.parametrize(("refresh_mode", "snapshot_attached"), [("", False), ("diff", True)])
+def test_file_snapshot_attached_only_in_diff_mode(
+    work_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch, refresh_mode: str, snapshot_attached: bool
+) -> None:
+    """Test that snapshot of files is kept in file contents message only when diff refresh needs it."""
+    # Given agent conversation and refresh mode
+    (work_dir / "app.py").write_text("a = 1\n", encoding="utf-8")
+    monkeypatch.setenv("FILE_CONTEXT_REFRESH", refresh_mode)
+    state = {"messages": [SystemMessage(content="system"), HumanMessage(content="task")]}
+    # When file contents are shown to agent
+    exchange_file_contents(state, {CodeFile("app.py")}, str(work_dir))
+    # Then snapshot is attached in diff mode only
+    assert hasattr(state["messages"][2], "contains_file_contents")
+    assert hasattr(state["messages"][2], "file_snapshot") == snapshot_attached
+
+
+def test_diff_mode_appends_changes(work_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that in diff mode file edit appends changes, keeping earlier file contents message unchanged."""
+    # Given file contents shown to agent in diff mode
+    (work_dir / "app.py").write_text("a = 1\nb = 2\n", encoding="utf-8")
+    monkeypatch.setenv("FILE_CONTEXT_REFRESH", "diff")
+    state = {"messages": [SystemMessage(content="system"), HumanMessage(content="task")]}
+    exchange_file_contents(state, {CodeFile("app.py")}, str(work_dir))
+    file_contents_message = state["messages"][2]
+    # When file is edited and contents refreshed
+    (work_dir / "app.py").write_text("a = 1\nb = 3\n", encoding="utf-8")
+    exchange_file_contents(state, {CodeFile("app.py")}, str(work_dir))
+    # Then only changes are appended
+    assert state["messages"][2] is file_contents_message
+    assert hasattr(state["messages"][-1], "contains_file_changes")
+    assert "2|b = 3 |2" in state["messages"][-1].content
@@ -0,0 +1,164 @@
+"""Unit tests for index manifest and planning of incremental re-indexing."""
+
+import os
+import pathlib
+
+import pytest
+
+from src.tools.rag import index_file_descriptions
+from src.tools.rag.index_file_descriptions import (
+    collect_file_pathes,
+    create_manifest,
+    plan_incremental_indexing,
+)
+from src.tools.rag.index_manifest import IndexManifest, chunk_id, content_hash
+
+
+def long_code(last_result: str = "value") -> str:
+    """Python code long enough to be split into several chunks; last_result is returned by its last function."""
+    functions = [
+        f"def function_{nr}():\n" + "    value = 1\n" * 40 + f"    return {last_result if nr == 3 else 'value'}"
+        for nr in range(4)
+    ]
+    return "\n\n".join(functions)
+
+
+def describe(work_dir: pathlib.Path, desc_id: str) -> None:
+    """Writes description file, as indexing does."""
+    descriptions = work_dir / ".clean_coder" / "files_and_folders_descriptions"
+    (descriptions / f"{desc_id.replace('/', '=')}.txt").write_text("description", encoding="utf-8")
+
+
+def index_all(work_dir: pathlib.Path) -> IndexManifest:
+    """Records all current files in manifest, as finished indexing does."""
+    manifest = IndexManifest(str(work_dir))
+    _, _, _, new_entries = plan_incremental_indexing(collect_file_pathes(str(work_dir)), manifest)
+    for desc_id, entry in new_entries.items():
+        manifest.update(desc_id, *entry)
+    manifest.save()
+    return IndexManifest(str(work_dir))
+
+
+def test_manifest_round_trip(work_dir: pathlib.Path) -> None:
+    """Test that manifest entries survive saving and loading."""
+    # Given manifest with one entry
+    manifest = IndexManifest(str(work_dir))
+    assert not manifest.exists()
+    manifest.update("src/app.py", "hash", ["chunk0", "chunk1"], [1700000000000000000, 120])
+    # When it is saved and loaded again
+    manifest.save()
+    loaded = IndexManifest(str(work_dir))
+    # Then entry is the same
+    assert loaded.exists()
+    assert loaded.entries == {
+        "src/app.py": {"hash": "hash", "chunks": ["chunk0", "chunk1"], "stat": [1700000000000000000, 120]}
+    }
+    assert loaded.description_ids("src/app.py") == ["src/app.py", chunk_id("src/app.py", 0), chunk_id("src/app.py", 1)]
+
+
+def test_corrupted_manifest_is_empty(work_dir: pathlib.Path) -> None:
+    """Test that corrupted manifest is not trusted, so all files are indexed again."""
+    # Given manifest file written partially
+    (work_dir / ".clean_coder" / "index_manifest.json").write_text('{"app.py": {"ha', encoding="utf-8")
+    # When it is loaded
+    manifest = IndexManifest(str(work_dir))
+    # Then it has no entries
+    assert manifest.entries == {}
+    assert manifest.file_changed("app.py", "hash")
+
+
+def test_unchanged_files_are_not_indexed_again(work_dir: pathlib.Path) -> None:
+    """Test that only new and modified files are planned for describing."""
+    # Given indexed project
+    (work_dir / "app.py").write_text("print('app')\n", encoding="utf-8")
+    (work_dir / "main.py").write_text("print('main')\n", encoding="utf-8")
+    manifest = index_all(work_dir)
+    # and given one file modified and one added
+    (work_dir / "main.py").write_text("print('main changed')\n", encoding="utf-8")
+    (work_dir / "new.py").write_text("print('new')\n", encoding="utf-8")
+    # When incremental indexing is planned
+    changed_files, _, ids_to_remove, new_entries = plan_incremental_indexing(
+        collect_file_pathes(str(work_dir)), manifest
+    )
+    # Then only modified and added files are described
+    assert sorted(file.name for file in changed_files) == ["main.py", "new.py"]
+    assert ids_to_remove == []
+    assert new_entries["main.py"][0] == content_hash(index_file_descriptions.get_content(work_dir / "main.py"))
+
+
+def test_files_with_unchanged_stat_are_not_read(work_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that only files which modification time or size changed are read to find changes."""
+    # Given indexed project, with one file modified and one only touched
+    (work_dir / "app.py").write_text("print('app')\n", encoding="utf-8")
+    (work_dir / "main.py").write_text("print('main')\n", encoding="utf-8")
+    (work_dir / "touched.py").write_text("print('touched')\n", encoding="utf-8")
+    manifest = index_all(work_dir)
+    (work_dir / "main.py").write_text("print('main changed')\n", encoding="utf-8")
+    os.utime(work_dir / "touched.py", ns=(0, 0))
+    read_files = []
+
+    def get_content(file_path: pathlib.Path) -> str:
+        read_files.append(file_path.name)
+        return file_path.name + "\n\n" + file_path.read_text(encoding="utf-8")
+
+    monkeypatch.setattr(index_file_descriptions, "get_content", get_content)
+    # When incremental indexing is planned
+    changed_files, _, _, _ = plan_incremental_indexing(collect_file_pathes(str(work_dir)), manifest)
+    # Then untouched file is not read, and touched file is not described, but its new stat is recorded
+    assert sorted(read_files) == ["main.py", "touched.py"]
+    assert [file.name for file in changed_files] == ["main.py"]
+    assert manifest.stats_refreshed
+    assert manifest.stat_unchanged("touched.py", [0, (work_dir / "touched.py").stat().st_size])
+
+
+def test_only_changed_chunks_are_described(work_dir: pathlib.Path) -> None:
+    """Test that chunks of modified file which content did not change are not described again."""
+    # Given indexed file consisting of several chunks
+    (work_dir / "long.py").write_text(long_code(), encoding="utf-8")
+    manifest = index_all(work_dir)
+    chunks_count = len(manifest.entries["long.py"]["chunks"])
+    assert chunks_count > 1
+    # When its last function is modified
+    (work_dir / "long.py").write_text(long_code("value + 1"), encoding="utf-8")
+    _, chunks_to_describe, _, _ = plan_incremental_indexing(collect_file_pathes(str(work_dir)), manifest)
+    # Then only its last chunk is described again
+    assert chunks_to_describe["long.py"] == [chunks_count - 1]
+
+
+def test_removed_file_descriptions_are_removed(work_dir: pathlib.Path) -> None:
+    """Test that descriptions of removed file and of its chunks are planned for removal."""
+    # Given indexed project with file consisting of several chunks
+    (work_dir / "app.py").write_text("print('app')\n", encoding="utf-8")
+    (work_dir / "long.py").write_text(long_code(), encoding="utf-8")
+    manifest = index_all(work_dir)
+    # When that file is removed
+    (work_dir / "long.py").unlink()
+    changed_files, _, ids_to_remove, new_entries = plan_incremental_indexing(
+        collect_file_pathes(str(work_dir)), manifest
+    )
+    # Then descriptions of file and all its chunks are removed, and file is removed from manifest
+    assert changed_files == []
+    assert ids_to_remove == manifest.description_ids("long.py")
+    assert len(ids_to_remove) > 1
+    assert new_entries == {"long.py": None}
+
+
+def test_create_manifest_for_index_without_manifest(work_dir: pathlib.Path) -> None:
+    """Test that manifest created for old index records described files only, without describing them again."""
+    # Given project indexed before manifest been introduced, with one file never described
+    (work_dir / "app.py").write_text("print('app')\n", encoding="utf-8")
+    (work_dir / "long.py").write_text(long_code(), encoding="utf-8")
+    (work_dir / "new.py").write_text("print('new')\n", encoding="utf-8")
+    describe(work_dir, "app.py")
+    describe(work_dir, "long.py")
+    describe(work_dir, chunk_id("long.py", 0))
+    # When manifest is created from current files
+    manifest = IndexManifest(str(work_dir))
+    create_manifest(manifest, collect_file_pathes(str(work_dir)))
+    manifest = IndexManifest(str(work_dir))
+    # Then described files are recorded with their chunks, and only the not described file is planned for indexing
+    assert sorted(manifest.entries) == ["app.py", "long.py"]
+    assert len(manifest.entries["long.py"]["chunks"]) > 1
+    changed_files, _, ids_to_remove, _ = plan_incremental_indexing(collect_file_pathes(str(work_dir)), manifest)
+    assert [file.name for file in changed_files] == ["new.py"]
+    assert ids_to_remove == []
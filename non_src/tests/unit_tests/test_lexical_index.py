@@ -0,0 +1,90 @@
+"""Unit tests for BM25 lexical index and reciprocal rank fusion."""
+
+import pathlib
+
+from src.tools.rag.lexical_index import LexicalIndex, is_identifier_query, reciprocal_rank_fusion, tokenize
+
+
+class FakeCollection:
+    """Vector collection returning stored descriptions, as Chroma collection.get does."""
+
+    def __init__(self, documents: dict) -> None:
+        self.documents = documents
+
+    def get(self, include: list) -> dict:
+        return {"ids": list(self.documents), "documents": list(self.documents.values())}
+
+
+def test_tokenize_splits_identifiers() -> None:
+    """Test that identifiers and paths are indexed whole and by words they consist of."""
+    # When identifiers of different styles are tokenized
+    tokens = tokenize("getUserProfile in api/users_view.py")
+    # Then whole identifiers and their parts are tokens
+    assert "getuserprofile" in tokens
+    assert {"get", "user", "profile"} <= set(tokens)
+    assert "api/users_view.py" in tokens
+    assert {"api", "users", "view", "py"} <= set(tokens)
+
+
+def test_identifier_query() -> None:
+    """Test that identifier and path queries are recognized, while natural language queries are not."""
+    assert is_identifier_query("get_user_profile")
+    assert is_identifier_query("UserProfile")
+    assert is_identifier_query("/api/users")
+    assert not is_identifier_query("where users are saved")
+    assert not is_identifier_query("users")
+
+
+def test_reciprocal_rank_fusion() -> None:
+    """Test that documents found by both searches go first."""
+    # Given vector and lexical rankings
+    vector_ranking = ["a.py", "b.py", "c.py"]
+    lexical_ranking = ["d.py", "b.py", "e.py"]
+    # When they are fused
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], n_results=3)
+    # Then document found by both goes before documents found by one only, and results are limited
+    assert fused == ["b.py", "a.py", "d.py"]
+
+
+def test_search_finds_exact_identifier(work_dir: pathlib.Path) -> None:
+    """Test that BM25 search ranks document containing searched identifier first."""
+    # Given index of few documents
+    index = LexicalIndex(str(work_dir / ".clean_coder" / "lexical_index.json"))
+    index.update("src/users.py", "Users module.\n\ndef get_user_profile(user_id): ...")
+    index.update("src/orders.py", "Orders module.\n\ndef create_order(user): ...")
+    index.update("src/main.py", "Entry point of application.")
+    # When identifier is searched
+    found = index.search("get_user_profile function", n_results=2)
+    exact = index.exact_matches("get_user_profile", n_results=2)
+    # Then document defining it is found first
+    assert found[0] == "src/users.py"
+    assert exact == ["src/users.py"]
+
+
+def test_index_round_trip(work_dir: pathlib.Path) -> None:
+    """Test that saved index is loaded with the same documents and removed ones stay removed."""
+    # Given saved index with one document removed
+    path = str(work_dir / ".clean_coder" / "lexical_index.json")
+    index = LexicalIndex(path)
+    index.update("a.py", "def alpha(): ...")
+    index.update("b.py", "def beta(): ...")
+    index.remove("b.py")
+    index.save()
+    # When it is loaded again
+    loaded = LexicalIndex(path)
+    # Then it contains the same documents
+    assert loaded.exists()
+    assert loaded.documents == index.documents
+    assert loaded.search("beta", n_results=5) == []
+
+
+def test_fill_from_collection(work_dir: pathlib.Path) -> None:
+    """Test that index missing for old project is built from all descriptions in vector collection."""
+    # Given project indexed before lexical index been introduced
+    index = LexicalIndex(str(work_dir / ".clean_coder" / "lexical_index.json"))
+    collection = FakeCollection({"app.py": "Flask application setup.", "main.py": "Starts the server."})
+    # When index is filled from collection
+    index.fill_from_collection(collection)
+    # Then all described files are searchable
+    assert sorted(index.documents) == ["app.py", "main.py"]
+    assert index.search("flask", n_results=5) == ["app.py"]
@@ -0,0 +1,109 @@
+"""Unit tests for append-only journal of Manager's conversation."""
+
+import json
+import pathlib
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.utilities import message_journal
+from src.utilities.message_journal import MessageJournal
+
+
+def conversation_turn(nr: int) -> list:
+    """AI message calling tool, tool result and user's answer."""
+    return [
+        AIMessage(content=f"turn {nr}", tool_calls=[{"name": "add_task", "args": {"nr": nr}, "id": f"call_{nr}"}]),
+        ToolMessage(content=f"task {nr} added", tool_call_id=f"call_{nr}"),
+        HumanMessage(content=f"answer {nr}"),
+    ]
+
+
+def dump(messages: list) -> list:
+    return [(message.type, message.content, getattr(message, "tool_calls", None)) for message in messages]
+
+
+@pytest.fixture
+def journal_path(tmp_path: pathlib.Path) -> str:
+    return str(tmp_path / "manager_messages.jsonl")
+
+
+def test_round_trip_keeps_message_attributes(journal_path: str) -> None:
+    """Test that saved conversation is loaded with the same messages and their custom attributes."""
+    # Given conversation with tasks message, which is found by its attribute
+    messages = [HumanMessage(content="tasks", tasks_and_progress_message=True), *conversation_turn(1)]
+    # When it is saved and loaded by new journal, as after restart
+    MessageJournal(journal_path).save(messages)
+    loaded = MessageJournal(journal_path).load()
+    # Then messages are the same
+    assert dump(loaded) == dump(messages)
+    assert hasattr(loaded[0], "tasks_and_progress_message")
+    assert loaded[2].tool_call_id == "call_1"
+
+
+def test_save_appends_only_new_messages(journal_path: str) -> None:
+    """Test that every save appends line with new messages only, referring to already saved ones by range."""
+    # Given saved conversation
+    journal = MessageJournal(journal_path)
+    messages = conversation_turn(1)
+    journal.save(messages)
+    # When conversation grows and is saved again, and saved once more without changes
+    messages = messages + conversation_turn(2)
+    journal.save(messages)
+    journal.save(messages)
+    # Then second line contains only new messages, and unchanged conversation is not saved
+    with open(journal_path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2
+    assert lines[1]["segments"][0] == {"old": [0, 3]}
+    assert len(lines[1]["segments"][1]["new"]) == 3
+    assert dump(MessageJournal(journal_path).load()) == dump(messages)
+
+
+def test_removed_messages_are_not_loaded(journal_path: str) -> None:
+    """Test that messages cut off from conversation are not loaded again."""
+    # Given conversation which oldest turn was cut off
+    journal = MessageJournal(journal_path)
+    messages = conversation_turn(1) + conversation_turn(2)
+    journal.save(messages)
+    messages = [HumanMessage(content="summary"), *messages[3:], *conversation_turn(3)]
+    journal.save(messages)
+    # When it is loaded
+    loaded = MessageJournal(journal_path).load()
+    # Then it is the conversation after cutting off
+    assert dump(loaded) == dump(messages)
+
+
+def test_partially_written_line_is_skipped(journal_path: str) -> None:
+    """Test that journal interrupted while writing last line loads conversation saved before."""
+    # Given journal which last line was written partially during crash
+    journal = MessageJournal(journal_path)
+    messages = conversation_turn(1)
+    journal.save(messages)
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"segments": [{"old": [0, 3]}, {"new": [{"type": "ai", "da')
+    # When it is loaded
+    loaded = MessageJournal(journal_path).load()
+    # Then conversation from last complete line is loaded
+    assert dump(loaded) == dump(messages)
+
+
+def test_journal_is_compacted(journal_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that journal much bigger than described conversation is rewritten into one line."""
+    # Given journal which grows by turns cut off from conversation
+    monkeypatch.setattr(message_journal, "MIN_COMPACTION_BYTES", 0)
+    journal = MessageJournal(journal_path)
+    messages = []
+    for nr in range(30):
+        messages = messages[-3:] + conversation_turn(nr)
+        journal.save(messages)
+    # When it is loaded by new journal, which keeps saving
+    with open(journal_path, encoding="utf-8") as f:
+        lines_count = len(f.readlines())
+    reloaded = MessageJournal(journal_path)
+    loaded = reloaded.load()
+    reloaded.save(loaded + conversation_turn(30))
+    # Then journal stays small and describes the latest conversation
+    assert lines_count < 30
+    assert dump(loaded) == dump(messages)
+    assert dump(MessageJournal(journal_path).load()) == dump(loaded + conversation_turn(30))
@@ -1,3 +1,5 @@
+from src.utilities import import_report
+import_report.install()
 if __name__ == "__main__":
     from src.utilities.start_work_functions import print_ascii_logo
     print_ascii_logo()
@@ -19,12 +21,23 @@ from src.utilities.util_functions import create_frontend_feedback_story
 from concurrent.futures import ThreadPoolExecutor
 from src.tools.rag.index_file_descriptions import prompt_index_project_files, upsert_file_list
 from src.tools.rag.retrieval import vdb_available
+from src.utilities.checkpointer import clear_task_checkpoints, prompt_resume_task, prompt_keep_task_checkpoints
 
 
 use_frontend_feedback = bool(os.getenv("FRONTEND_URL"))
 
 
 def run_clean_coder_pipeline(task: str, work_dir: str, doc_harvest: bool = False):
+    prompt_resume_task(task)
+    try:
+        run_agents(task, work_dir, doc_harvest)
+    except KeyboardInterrupt:
+        prompt_keep_task_checkpoints(task)
+        raise
+    clear_task_checkpoints(task)
+
+
+def run_agents(task: str, work_dir: str, doc_harvest: bool = False):
     researcher = Researcher(work_dir)
     files, image_paths = researcher.research_task(task)
     documentation = None
@@ -65,6 +78,7 @@ if __name__ == "__main__":
     if not work_dir:
         raise Exception("WORK_DIR variable not provided. Please add WORK_DIR to .env file")
     set_up_dot_clean_coder_dir(work_dir)
+    import_report.report()
     prompt_index_project_files()
     task = user_input("Provide task to be executed. ")
     run_clean_coder_pipeline(task, work_dir)
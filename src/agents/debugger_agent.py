@@ -17,10 +17,14 @@ from src.utilities.util_functions import (
     read_coderrules,
     convert_images,
     list_directory_tree,
+    track_file_changes,
 )
+from src.utilities.checkpointer import get_checkpointer, run_graph, saved_state
+from src.utilities.context_compaction import ContextCompactor
 from src.utilities.llms import init_llms_medium_intelligence
 from src.utilities.langgraph_common_functions import (
     call_model, call_tool, ask_human, after_ask_human_condition, multiple_tools_msg, no_tools_msg, agent_looped_human_help,
+    READ_ONLY_TOOLS,
 )
 from src.utilities.objects import CodeFile
 from src.agents.frontend_feedback import execute_screenshot_codes
@@ -60,6 +64,7 @@ class Debugger():
         self.images = convert_images(image_paths)
         self.human_feedback = human_feedback
         self.playwright_code = playwright_code
+        self.context_compactor = ContextCompactor()
 
         # workflow definition
         debugger_workflow = StateGraph(AgentState)
@@ -78,32 +83,26 @@ class Debugger():
         debugger_workflow.add_conditional_edges("check_log", self.after_check_log_condition)
         debugger_workflow.add_conditional_edges("human_end_process_confirmation", after_ask_human_condition)
 
-        self.debugger = debugger_workflow.compile()
+        self.debugger = debugger_workflow.compile(checkpointer=get_checkpointer())
 
     # node functions
     def call_model_debugger(self, state):
-        state = call_model(state, self.llms)
+        state = call_model(state, self.llms, tools=self.tools)
         state = call_tool(state, self.tools)
 
         messages = [msg for msg in state["messages"] if msg.type == "ai"]
         last_ai_message = messages[-1]
-        if len(last_ai_message.tool_calls) > 1:
+        # several read-only tool calls are allowed, as they are executed together
+        only_read_only_calls = all(tool_call["name"] in READ_ONLY_TOOLS for tool_call in last_ai_message.tool_calls)
+        if len(last_ai_message.tool_calls) > 1 and not only_read_only_calls:
             for tool_call in last_ai_message.tool_calls:
                 state["messages"].append(ToolMessage(content="too much tool calls", tool_call_id=tool_call["id"]))
             state["messages"].append(HumanMessage(content=multiple_tools_msg))
         elif len(last_ai_message.tool_calls) == 0:
             state["messages"].append(HumanMessage(content=no_tools_msg))
 
-        for tool_call in last_ai_message.tool_calls:
-            if tool_call["name"] == "create_file_with_code":
-                new_file = CodeFile(tool_call["args"]["filename"], is_modified=True)
-                self.files.add(new_file)
-            elif tool_call["name"] in ["replace_code", "insert_code"]:
-                filename = tool_call["args"]["filename"]
-                for file in self.files:
-                    if file.filename == filename:
-                        file.is_modified = True
-                        break
+        track_file_changes(self.files, [last_ai_message])
+        state["messages"] = self.context_compactor.compact(state["messages"])
         return state
 
     def check_log(self, state):
@@ -154,11 +153,13 @@ class Debugger():
     def do_task(self, task: str, plan: str) -> List[CodeFile]:
         print_formatted("Debugger starting its work", color="green")
         print_formatted("🕵️‍♂️ Need to improve your code? I can help!", color="light_blue")
+        # files created or edited before interruption of that task
+        track_file_changes(self.files, saved_state(self.debugger, task, "Debugger").get("messages", []))
         file_contents = check_file_contents(self.files, self.work_dir)
         inputs = {"messages": [
             self.system_message,
             HumanMessage(content=f"Task: {task}\n\n######\n\nPlan which developer implemented already:\n\n{plan}"),
-            HumanMessage(content=list_directory_tree(self.work_dir)),
+            HumanMessage(content=list_directory_tree(self.work_dir, task=task)),
             HumanMessage(content=f"File contents: {file_contents}", contains_file_contents=True),
             HumanMessage(content=f"Human feedback: {self.human_feedback}"),
         ]}
@@ -168,7 +169,7 @@ class Debugger():
             print_formatted("Making screenshots, please wait a while...", color="light_blue")
             screenshot_msg = execute_screenshot_codes(self.playwright_code)
             inputs["messages"].append(screenshot_msg)
-        self.debugger.invoke(inputs, {"recursion_limit": 150})
+        run_graph(self.debugger, inputs, task, "Debugger", 150)
 
         return self.files
 
@@ -10,8 +10,10 @@ from langchain.tools import tool
 from src.utilities.llms import init_llms_medium_intelligence
 from src.utilities.print_formatters import print_formatted, print_error
 from src.utilities.util_functions import (
-    check_file_contents, exchange_file_contents, bad_tool_call_looped
+    check_file_contents, exchange_file_contents, bad_tool_call_looped, file_snapshot_attributes, track_file_changes
 )
+from src.utilities.checkpointer import get_checkpointer, run_graph, saved_state
+from src.utilities.context_compaction import ContextCompactor
 from src.utilities.langgraph_common_functions import (
     call_model, call_tool, multiple_tools_msg, no_tools_msg, agent_looped_human_help
 )
@@ -48,6 +50,7 @@ class Executor():
             content=system_prompt_template
         )
         self.files = files
+        self.context_compactor = ContextCompactor()
 
         # workflow definition
         executor_workflow = StateGraph(AgentState)
@@ -60,7 +63,7 @@ class Executor():
         executor_workflow.add_edge("human_help", "agent")
         executor_workflow.add_conditional_edges("agent", self.after_agent_condition)
 
-        self.executor = executor_workflow.compile()
+        self.executor = executor_workflow.compile(checkpointer=get_checkpointer())
 
     # node functions
     def call_model_executor(self, state):
@@ -81,18 +84,10 @@ class Executor():
             state["messages"].append(HumanMessage(content=multiple_tools_msg))
         elif len(last_ai_message.tool_calls) == 0:
             state["messages"].append(HumanMessage(content=no_tools_msg))
-        for tool_call in last_ai_message.tool_calls:
-            if tool_call["name"] == "create_file_with_code":
-                new_file = CodeFile(tool_call["args"]["filename"], is_modified=True)
-                self.files.add(new_file)
-            elif tool_call["name"] in ["replace_code", "insert_code"]:
-                filename = tool_call["args"]["filename"]
-                for file in self.files:
-                    if file.filename == filename:
-                        file.is_modified = True
-                        break
+        track_file_changes(self.files, [last_ai_message])
 
         state = exchange_file_contents(state, self.files, self.work_dir)
+        state["messages"] = self.context_compactor.compact(state["messages"])
 
         return state
 
@@ -112,13 +107,19 @@ class Executor():
     def do_task(self, task: str, plan: str) -> List[CodeFile]:
         print_formatted("Executor starting its work", color="green")
         print_formatted("✅ I follow the plan and will implement necessary changes!", color="light_blue")
+        # files created or edited before interruption of that task
+        track_file_changes(self.files, saved_state(self.executor, task, "Executor").get("messages", []))
         file_contents = check_file_contents(self.files, self.work_dir)
         inputs = {"messages": [
             self.system_message,
             HumanMessage(content=f"Task: {task}\n\n######\n\nPlan:\n\n{plan}"),
-            HumanMessage(content=f"File contents: {file_contents}", contains_file_contents=True)
+            HumanMessage(
+                content=f"File contents: {file_contents}",
+                contains_file_contents=True,
+                **file_snapshot_attributes(self.files, self.work_dir),
+            )
         ]}
-        self.executor.invoke(inputs, {"recursion_limit": 150})
+        run_graph(self.executor, inputs, task, "Executor", 150)
 
         return self.files
 
@@ -4,7 +4,8 @@ from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv, find_dotenv
 from langchain.tools import tool
 from src.tools.tools_coder_pipeline import (
-     prepare_see_file_tool, prepare_list_dir_tool, retrieve_files_by_semantic_query
+     prepare_see_file_tool, prepare_list_dir_tool, retrieve_files_by_semantic_query,
+     retrieve_files_by_semantic_queries,
 )
 from src.tools.rag.retrieval import vdb_available
 from src.utilities.util_functions import list_directory_tree
@@ -12,6 +13,7 @@ from src.utilities.langgraph_common_functions import (
     call_model, call_tool, no_tools_msg
 )
 from src.utilities.llms import init_llms_mini
+from src.utilities.checkpointer import get_checkpointer, run_graph
 import os
 
 
@@ -59,7 +61,7 @@ class ResearchFileAnswerer():
         list_dir = prepare_list_dir_tool(work_dir)
         self.tools = [see_file, list_dir, final_response_file_answerer]
         if vdb_available():
-            self.tools.append(retrieve_files_by_semantic_query)
+            self.tools.extend([retrieve_files_by_semantic_query, retrieve_files_by_semantic_queries])
         self.llms = init_llms_mini(self.tools, "File Answerer", temp=0.2)
 
         # workflow definition
@@ -73,7 +75,7 @@ class ResearchFileAnswerer():
         researcher_workflow.add_conditional_edges("agent", after_agent_condition)
         researcher_workflow.add_edge("tool", "agent")
 
-        self.researcher = researcher_workflow.compile()
+        self.researcher = researcher_workflow.compile(checkpointer=get_checkpointer())
 
     # node functions
     def call_tool_researcher(self, state):
@@ -94,8 +96,10 @@ class ResearchFileAnswerer():
     def research_and_answer(self, questions):
         system_message = system_prompt_template.format(questions=questions)
         inputs = {
-            "messages": [SystemMessage(content=system_message), HumanMessage(content=list_directory_tree(work_dir))]}
-        researcher_response = self.researcher.invoke(inputs, {"recursion_limit": 100})["messages"][-1]
+            "messages": [SystemMessage(content=system_message), HumanMessage(content=list_directory_tree(work_dir, task=questions))]}
+        researcher_response = run_graph(
+            self.researcher, inputs, questions, "File Answerer", 100, keep_finished=False
+        )["messages"][-1]
         answer = researcher_response.tool_calls[0]["args"]
 
         return answer
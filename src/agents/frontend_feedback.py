@@ -1,17 +1,15 @@
 import os
 from langchain_core.messages import HumanMessage
-from src.utilities.llms import init_llms_medium_intelligence
+from src.utilities.llms import init_llms_medium_intelligence, llm_with_fallbacks
+from src.utilities.lazy import LazyObject
 from src.utilities.start_work_functions import read_frontend_feedback_story
 import base64
 import textwrap
-from src.agents.file_answerer import ResearchFileAnswerer
 from typing import Optional
 from pydantic import BaseModel, Field
 
 
-llms = init_llms_medium_intelligence(run_name="Frontend Feedback")
-
-llm = llms[0].with_fallbacks(llms[1:])
+llm = LazyObject(lambda: llm_with_fallbacks(init_llms_medium_intelligence(run_name="Frontend Feedback")))
 
 # read prompt from file
 parent_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
@@ -7,18 +7,18 @@ from src.utilities.util_functions import check_file_contents, convert_images, ge
 from src.utilities.langgraph_common_functions import after_ask_human_condition
 from src.utilities.user_input import user_input
 from src.utilities.graphics import LoadingAnimation
-from src.utilities.llms import init_llms_high_intelligence, init_llms_mini, init_llms_medium_intelligence
+from src.utilities.llms import init_llms_high_intelligence, init_llms_mini, init_llms_medium_intelligence, llm_with_fallbacks
+from src.utilities.lazy import LazyObject
+from src.utilities.checkpointer import get_checkpointer, run_graph
 import os
 
 
 load_dotenv(find_dotenv())
 
-llms_planners = init_llms_high_intelligence(run_name="Planner")
-llm_strong = llms_planners[0].with_fallbacks(llms_planners[1:])
-llms_middle_strength = init_llms_medium_intelligence(run_name="Plan finalizer")
-llm_middle_strength = llms_middle_strength[0].with_fallbacks(llms_middle_strength[1:])
-llms_controller = init_llms_mini(run_name="Plan Files Controller")
-llm_controller = llms_controller[0].with_fallbacks(llms_controller[1:])
+# LLMs are created on first use, not when module is imported
+llm_strong = LazyObject(lambda: llm_with_fallbacks(init_llms_high_intelligence(run_name="Planner")))
+llm_middle_strength = LazyObject(lambda: llm_with_fallbacks(init_llms_medium_intelligence(run_name="Plan finalizer")))
+llm_controller = LazyObject(lambda: llm_with_fallbacks(init_llms_mini(run_name="Plan Files Controller")))
 
 
 class AgentState(TypedDict):
@@ -99,13 +99,13 @@ planner_workflow.add_node("agent", call_simple_planer)
 planner_workflow.set_entry_point("advanced_planner")
 planner_workflow.add_conditional_edges("advanced_planner", after_ask_human_condition)
 planner_workflow.add_conditional_edges("agent", after_ask_human_condition)
-planner = planner_workflow.compile()
+planner = planner_workflow.compile(checkpointer=get_checkpointer())
 
 
 def planning(task, text_files, image_paths, work_dir, documentation=None, dir_tree=None, coderrules=None):
     # that ifs needed for sake of testing (manual tests)
     if not dir_tree:
-        dir_tree = list_directory_tree(work_dir)
+        dir_tree = list_directory_tree(work_dir, task=task)
     if not coderrules:
         coderrules = read_coderrules()
     file_contents = check_file_contents(text_files, work_dir, line_numbers=False)
@@ -135,6 +135,6 @@ def planning(task, text_files, image_paths, work_dir, documentation=None, dir_tr
         inputs["messages"].append(HumanMessage(content=images))
         inputs["logic_planner_messages"].append(HumanMessage(content=images))
         inputs["plan_finalizer_messages"].append(HumanMessage(content=images))
-    planner_response = planner.invoke(inputs, {"recursion_limit": 50})["messages"][-2]
+    planner_response = run_graph(planner, inputs, task, "Planner", 50)["messages"][-2]
 
     return planner_response
@@ -6,7 +6,8 @@ from langgraph.graph import StateGraph
 from dotenv import load_dotenv, find_dotenv
 from langchain_core.tools import tool
 from src.tools.tools_coder_pipeline import (
-     prepare_see_file_tool, prepare_list_dir_tool, retrieve_files_by_semantic_query
+     prepare_see_file_tool, prepare_list_dir_tool, retrieve_files_by_semantic_query,
+     retrieve_files_by_semantic_queries,
 )
 from src.tools.rag.retrieval import vdb_available
 from src.utilities.util_functions import list_directory_tree, read_coderrules, load_prompt
@@ -15,6 +16,7 @@ from src.utilities.langgraph_common_functions import (
 )
 from src.utilities.print_formatters import print_formatted
 from src.utilities.llms import init_llms_medium_intelligence
+from src.utilities.checkpointer import get_checkpointer, run_graph
 import os
 
 
@@ -63,7 +65,7 @@ class Researcher():
         list_dir = prepare_list_dir_tool(work_dir)
         self.tools = [see_file, list_dir, final_response_researcher]
         if vdb_available():
-            self.tools.append(retrieve_files_by_semantic_query)
+            self.tools.extend([retrieve_files_by_semantic_query, retrieve_files_by_semantic_queries])
         self.llms = init_llms_medium_intelligence(self.tools, "Researcher")
 
         # workflow definition
@@ -77,11 +79,11 @@ class Researcher():
         researcher_workflow.add_conditional_edges("agent", after_agent_condition)
         researcher_workflow.add_conditional_edges("human", after_ask_human_condition)
 
-        self.researcher = researcher_workflow.compile()
+        self.researcher = researcher_workflow.compile(checkpointer=get_checkpointer())
 
     # node functions
     def call_model_researcher(self, state):
-        state = call_model(state, self.llms)
+        state = call_model(state, self.llms, tools=self.tools)
         last_message = state["messages"][-1]
         if len(last_message.tool_calls) == 0:
             state["messages"].append(HumanMessage(content=no_tools_msg))
@@ -103,8 +105,8 @@ class Researcher():
         system_prompt_template = load_prompt("researcher_system")
         system_message = system_prompt_template.format(task=task, project_rules=read_coderrules())
         inputs = {
-            "messages": [SystemMessage(content=system_message), HumanMessage(content=list_directory_tree(work_dir))]}
-        researcher_response = self.researcher.invoke(inputs, {"recursion_limit": 100})["messages"][-3]
+            "messages": [SystemMessage(content=system_message), HumanMessage(content=list_directory_tree(work_dir, task=task))]}
+        researcher_response = run_graph(self.researcher, inputs, task, "Researcher", 100)["messages"][-3]
         response_args = researcher_response.tool_calls[0]["args"]
         text_files = set(CodeFile(f) for f in response_args["files_to_work_on"] + response_args["reference_files"])
         image_paths = response_args["template_images"]
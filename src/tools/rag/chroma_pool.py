@@ -0,0 +1,93 @@
+"""
+Process-wide registry of Chroma clients and collections. Client of every work dir and its collections are created
+once and reused by all agents and retrievals, instead of opening vector storage on every call.
+"""
+import time
+import atexit
+import threading
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from src.utilities.util_functions import join_paths
+
+
+# Seconds after which cached collection is checked again before being reused.
+HEALTH_CHECK_INTERVAL = 30
+
+
+class ChromaPool:
+    clients = {}
+    # (work_dir, collection name) -> (collection, time of last successful health check)
+    collections = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_client(work_dir):
+        if work_dir not in ChromaPool.clients:
+            ChromaPool.clients[work_dir] = chromadb.PersistentClient(path=join_paths(work_dir, '.clean_coder/chroma_base'))
+        return ChromaPool.clients[work_dir]
+
+    @staticmethod
+    def get_collection(work_dir, name, embedding_function, metadata=None, create=False):
+        """
+        Returns cached collection if it is still healthy, otherwise opens it again. If collection does not exist,
+        creates it with provided metadata when create is True, or raises ValueError.
+        """
+        key = (work_dir, name)
+        with ChromaPool.lock:
+            if key in ChromaPool.collections:
+                collection, last_check = ChromaPool.collections[key]
+                if time.monotonic() - last_check < HEALTH_CHECK_INTERVAL or ChromaPool.healthy(collection):
+                    ChromaPool.collections[key] = (collection, time.monotonic())
+                    return collection
+                # collection was deleted or storage broken - open it again with fresh client
+                ChromaPool.close_work_dir(work_dir)
+
+            client = ChromaPool.get_client(work_dir)
+            try:
+                collection = client.get_collection(name=name, embedding_function=embedding_function)
+            except ValueError:
+                if not create:
+                    raise
+                collection = client.create_collection(
+                    name=name, embedding_function=embedding_function, metadata=metadata
+                )
+            ChromaPool.collections[key] = (collection, time.monotonic())
+            return collection
+
+    @staticmethod
+    def delete_collection(work_dir, name):
+        with ChromaPool.lock:
+            ChromaPool.collections.pop((work_dir, name), None)
+            ChromaPool.get_client(work_dir).delete_collection(name=name)
+
+    @staticmethod
+    def healthy(collection):
+        try:
+            collection.count()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def close_work_dir(work_dir):
+        for key in [key for key in ChromaPool.collections if key[0] == work_dir]:
+            del ChromaPool.collections[key]
+        client = ChromaPool.clients.pop(work_dir, None)
+        if client is None:
+            return
+        # stopping system persists vector indexes to disk; chroma keeps systems in its own cache too
+        identifier = getattr(client, "_identifier", None)
+        system = SharedSystemClient._identifer_to_system.pop(identifier, None)
+        if system is not None:
+            system.stop()
+
+    @staticmethod
+    def close(work_dir=None):
+        """Closes client of provided work dir, or all clients if work dir not provided."""
+        with ChromaPool.lock:
+            work_dirs = [work_dir] if work_dir else list(ChromaPool.clients)
+            for closed_work_dir in work_dirs:
+                ChromaPool.close_work_dir(closed_work_dir)
+
+
+atexit.register(ChromaPool.close)
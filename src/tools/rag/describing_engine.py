@@ -0,0 +1,150 @@
+"""
+Asynchronous engine describing files and file chunks for the vector storage. Jobs of both kinds are put into one
+queue and processed concurrently by workers, so throughput is not bounded by the slowest call of a batch.
+Every LLM provider gets its own requests per minute and tokens per minute budget.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from src.utilities.llms import init_llms_mini
+from src.utilities.util_functions import load_prompt
+from src.utilities.print_formatters import print_formatted
+
+
+# Default budgets per provider; INDEXING_RPM_LIMIT and INDEXING_TPM_LIMIT env variables override them.
+PROVIDER_LIMITS = {
+    "ChatAnthropic": {"rpm": 50, "tpm": 50_000},
+    "ChatOpenAI": {"rpm": 500, "tpm": 200_000},
+    "ChatOllama": {"rpm": 10_000, "tpm": 10_000_000},
+}
+DEFAULT_LIMITS = {"rpm": 60, "tpm": 100_000}
+# Rough amount of tokens of the description LLM writes, added to the estimated prompt size.
+EXPECTED_OUTPUT_TOKENS = 300
+
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+
+class RateLimiter:
+    """Sliding one-minute window limiter of requests and tokens."""
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = deque()  # (timestamp, tokens) of requests sent during last minute
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        # single request bigger than whole budget would wait forever
+        tokens = min(tokens, self.tpm)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.requests and now - self.requests[0][0] >= 60:
+                    self.requests.popleft()
+                used_tokens = sum(request_tokens for _, request_tokens in self.requests)
+                if len(self.requests) < self.rpm and used_tokens + tokens <= self.tpm:
+                    self.requests.append((now, tokens))
+                    return
+                await asyncio.sleep(60 - (now - self.requests[0][0]))
+
+
+class DescriptionJob:
+    """Single description to write: whole file (describe_files prompt) or its chunk (describe_file_chunks prompt)."""
+    def __init__(self, desc_id, prompt_name, inputs, source_hash=None):
+        self.desc_id = desc_id
+        self.prompt_name = prompt_name
+        self.inputs = inputs
+        # hash of described file or chunk content
+        self.source_hash = source_hash
+
+    def estimated_tokens(self):
+        return sum(estimate_tokens(value) for value in self.inputs.values()) + EXPECTED_OUTPUT_TOKENS
+
+
+def provider_name(llm):
+    bound = llm.bound
+    # OpenRouter and locally hosted models use ChatOpenAI class too, distinguish them by api base
+    api_base = getattr(bound, "openai_api_base", None)
+    return f"{bound.__class__.__name__}({api_base})" if api_base else bound.__class__.__name__
+
+
+def provider_limiter(llm):
+    limits = PROVIDER_LIMITS.get(llm.bound.__class__.__name__, DEFAULT_LIMITS)
+    rpm = int(os.getenv("INDEXING_RPM_LIMIT") or limits["rpm"])
+    tpm = int(os.getenv("INDEXING_TPM_LIMIT") or limits["tpm"])
+    return RateLimiter(rpm, tpm)
+
+
+class DescribingEngine:
+    """
+    Describes jobs concurrently. Number of requests in flight is limited by INDEXING_CONCURRENCY env variable.
+    If provider fails, job is retried with next provider from init_llms_mini list.
+    """
+    def __init__(self, run_name="File Describer"):
+        # every run has its own event loop, so models with async clients from previous runs can't be reused
+        self.llms = init_llms_mini(tools=[], run_name=run_name, shared=False)
+        self.concurrency = int(os.getenv("INDEXING_CONCURRENCY") or 16)
+        self.chains = {}
+
+    def get_chain(self, llm, prompt_name):
+        key = (id(llm), prompt_name)
+        if key not in self.chains:
+            prompt = ChatPromptTemplate.from_template(load_prompt(prompt_name))
+            self.chains[key] = prompt | llm | StrOutputParser()
+        return self.chains[key]
+
+    def run(self, jobs, on_description):
+        """
+        Describes all jobs, calling on_description(job, description) as soon as every description is ready.
+        Returns list of jobs which could not be described by any provider.
+        """
+        if not jobs:
+            return []
+        return asyncio.run(self._run(jobs, on_description))
+
+    async def _run(self, jobs, on_description):
+        # limiters have to be created inside of event loop they are used in
+        limiters = {}
+        for llm in self.llms:
+            limiters.setdefault(provider_name(llm), provider_limiter(llm))
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        failed_jobs = []
+        workers = [
+            self._worker(queue, limiters, on_description, failed_jobs)
+            for _ in range(min(self.concurrency, len(jobs)))
+        ]
+        await asyncio.gather(*workers)
+        if failed_jobs:
+            print_formatted(f"Failed to describe {len(failed_jobs)} files/chunks.", color="yellow")
+        return failed_jobs
+
+    async def _worker(self, queue, limiters, on_description, failed_jobs):
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            description = await self._describe(job, limiters)
+            if description is None:
+                failed_jobs.append(job)
+            else:
+                on_description(job, description)
+
+    async def _describe(self, job, limiters):
+        for llm in self.llms:
+            await limiters[provider_name(llm)].acquire(job.estimated_tokens())
+            try:
+                return await self.get_chain(llm, job.prompt_name).ainvoke(job.inputs)
+            except Exception as e:
+                print_formatted(
+                    f"\nException happened: {e} with llm: {llm.bound.__class__.__name__} while describing "
+                    f"{job.desc_id}. Switching to next LLM if available...",
+                    color="yellow"
+                )
+        return None
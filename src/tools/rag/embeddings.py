@@ -0,0 +1,222 @@
+"""
+Embedding backends for vector storage of file descriptions. Backend is chosen with EMBEDDING_BACKEND env variable:
+- "local" (default): all-MiniLM-L6-v2 ONNX model running on CPU - Chroma's default, so indexes created before
+  backends been introduced stay valid. Model is downloaded once, next runs work offline.
+- "sentence_transformers": sentence-transformers model provided in EMBEDDING_MODEL. Needs sentence-transformers package.
+- "openai": text-embedding-3-small through OpenAI API.
+- "hashing": hashing vectorizer of identifiers and words. Needs neither model nor network; lowest quality.
+
+Texts are embedded in batches of EMBEDDING_BATCH_SIZE, and embeddings are cached by text hash in
+.clean_coder/embedding_cache.sqlite, so unchanged descriptions (and repeated queries) are never embedded again.
+Least recently used embeddings are evicted when cache grows above MAX_CACHED_EMBEDDINGS.
+
+Collection remembers backend it was indexed with. Vectors of different backends can't be compared, so collection
+indexed with other backend than configured one is not queried until its descriptions are embedded again.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from chromadb.utils import embedding_functions
+from src.utilities.util_functions import join_paths
+from src.utilities.print_formatters import print_formatted
+
+
+DEFAULT_BACKEND = "local"
+# collections created before backends been introduced used Chroma's default model
+LEGACY_BACKEND_NAME = "local:all-MiniLM-L6-v2"
+HASHING_DIMENSIONS = 512
+MAX_CACHED_EMBEDDINGS = 20000
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HashingEmbeddingFunction:
+    """Projects tokens of text into fixed size vector by their hashes. Deterministic and dependency free."""
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        return [self.embed(text) for text in input]
+
+    def embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        # split identifiers as snake_case and camelCase into words, but keep whole identifiers too
+        for token in re.findall(r"[A-Za-z0-9_]+", text):
+            words = [token] + re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", token)
+            for word in words:
+                digest = hashlib.blake2b(word.lower().encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class EmbeddingCache:
+    """Persistent store of embeddings keyed by backend name and text hash."""
+    def __init__(self, path):
+        # embeddings are computed also in background upload thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(backend TEXT, text_hash TEXT, vector BLOB, used_at REAL, PRIMARY KEY (backend, text_hash))"
+            )
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(embeddings)")]
+            # cache created before eviction been introduced
+            if "used_at" not in columns:
+                self.connection.execute("ALTER TABLE embeddings ADD COLUMN used_at REAL DEFAULT 0")
+            self.connection.commit()
+
+    def get_many(self, backend, hashes):
+        found = {}
+        unique_hashes = list(set(hashes))
+        now = time.time()
+        # stay below sqlite limit of query parameters
+        for i in range(0, len(unique_hashes), 500):
+            hashes_part = unique_hashes[i:i + 500]
+            placeholders = ",".join("?" * len(hashes_part))
+            with self.lock:
+                rows = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE backend = ? AND text_hash IN ({placeholders})",
+                    [backend, *hashes_part],
+                ).fetchall()
+                if rows:
+                    self.connection.execute(
+                        f"UPDATE embeddings SET used_at = ? WHERE backend = ? AND text_hash IN ({placeholders})",
+                        [now, backend, *hashes_part],
+                    )
+                    self.connection.commit()
+            for hash_, vector in rows:
+                found[hash_] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, backend, hashes, vectors):
+        now = time.time()
+        rows = [
+            (backend, hash_, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for hash_, vector in zip(hashes, vectors)
+        ]
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (backend, text_hash, vector, used_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self.connection.commit()
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used embeddings above size limit."""
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (MAX_CACHED_EMBEDDINGS,),
+            )
+            self.connection.commit()
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function embedding only texts not found in cache, in batches."""
+    def __init__(self, backend_name, embedder, cache, batch_size):
+        self.backend_name = backend_name
+        self.embedder = embedder
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def __call__(self, input):
+        hashes = [text_hash(text) for text in input]
+        embeddings = self.cache.get_many(self.backend_name, hashes)
+        missing = {}
+        for text, hash_ in zip(input, hashes):
+            if hash_ not in embeddings:
+                missing[hash_] = text
+        missing_hashes = list(missing)
+        for i in range(0, len(missing_hashes), self.batch_size):
+            batch_hashes = missing_hashes[i:i + self.batch_size]
+            vectors = [
+                np.asarray(vector, dtype=np.float32).tolist()
+                for vector in self.embedder([missing[hash_] for hash_ in batch_hashes])
+            ]
+            self.cache.put_many(self.backend_name, batch_hashes, vectors)
+            embeddings.update(zip(batch_hashes, vectors))
+        return [embeddings[hash_] for hash_ in hashes]
+
+
+def create_embedder(backend):
+    """Returns name of backend with model and function embedding list of texts."""
+    if backend == "local":
+        return "local:all-MiniLM-L6-v2", embedding_functions.ONNXMiniLM_L6_V2()
+    if backend == "sentence_transformers":
+        model_name = os.getenv("EMBEDDING_MODEL") or "all-MiniLM-L6-v2"
+        return (
+            f"sentence_transformers:{model_name}",
+            embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name),
+        )
+    if backend == "openai":
+        return "openai:text-embedding-3-small", embedding_functions.OpenAIEmbeddingFunction(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model_name="text-embedding-3-small"
+        )
+    if backend == "hashing":
+        return f"hashing:{HASHING_DIMENSIONS}", HashingEmbeddingFunction()
+    raise Exception(
+        f"Unknown EMBEDDING_BACKEND '{backend}'. Use one of: local, sentence_transformers, openai, hashing."
+    )
+
+
+_embedding_functions = {}
+
+
+def get_embedding_function():
+    """Returns embedding function configured in env, created once per work dir."""
+    work_dir = os.getenv("WORK_DIR")
+    backend = os.getenv("EMBEDDING_BACKEND") or DEFAULT_BACKEND
+    key = (work_dir, backend)
+    if key not in _embedding_functions:
+        backend_name, embedder = create_embedder(backend)
+        cache = EmbeddingCache(join_paths(work_dir, ".clean_coder/embedding_cache.sqlite"))
+        batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE") or 64)
+        _embedding_functions[key] = CachedEmbeddingFunction(backend_name, embedder, cache, batch_size)
+    return _embedding_functions[key]
+
+
+def collection_metadata():
+    return {"embedding_backend": get_embedding_function().backend_name}
+
+
+def indexed_backend(collection):
+    return (collection.metadata or {}).get("embedding_backend", LEGACY_BACKEND_NAME)
+
+
+def embedding_backend_matches(collection):
+    return indexed_backend(collection) == get_embedding_function().backend_name
+
+
+_reported_mismatches = set()
+
+
+def check_embedding_backend(collection):
+    """
+    Returns True if collection was indexed with configured embedding backend. Otherwise its vectors won't match
+    vectors of queries - user is told once to re-index project and False is returned.
+    """
+    if embedding_backend_matches(collection):
+        return True
+    configured_backend = get_embedding_function().backend_name
+    if collection.name not in _reported_mismatches:
+        _reported_mismatches.add(collection.name)
+        print_formatted(
+            f"Project files were indexed with '{indexed_backend(collection)}' embeddings, but '{configured_backend}' "
+            f"is configured in EMBEDDING_BACKEND. Vector search is off until you change EMBEDDING_BACKEND back or "
+            f"re-index project files when asked at start.",
+            color="yellow"
+        )
+    return False
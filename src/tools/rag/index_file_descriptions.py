@@ -1,22 +1,23 @@
 import os
 from pathlib import Path
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv, find_dotenv
-import chromadb
 import sys
 import questionary
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 from src.utilities.util_functions import join_paths, read_coderrules
-from src.utilities.start_work_functions import file_folder_ignored
-from src.utilities.llms import init_llms_mini
+from src.utilities.start_work_functions import walk_not_ignored
 from src.tools.rag.code_splitter import split_code
+from src.tools.rag.index_manifest import IndexManifest, content_hash, chunk_id, file_stat
+from src.tools.rag.describing_engine import DescriptionJob, DescribingEngine
+from src.tools.rag.indexing_journal import IndexingJournal
+from src.tools.rag.streaming_upload import StreamingUploader
+from src.tools.rag.ranking_cache import get_ranking_cache
+from src.tools.rag.lexical_index import LexicalIndex
 from src.utilities.print_formatters import print_formatted
-from src.tools.rag.retrieval import vdb_available
+from src.tools.rag.retrieval import vdb_available, open_collection, collection_name
 from src.utilities.manager_utils import QUESTIONARY_STYLE
 from tqdm import tqdm
 import glob
-from chromadb.utils import embedding_functions
 
 
 load_dotenv(find_dotenv())
@@ -29,20 +30,11 @@ RESET = "\033[0m"
 # Customize tqdm's bar format with golden and magenta colors
 bar_format = (
     f"{GOLDEN}{{desc}}: {MAGENTA}{{percentage:3.0f}}%{GOLDEN}|"
-    f"{{bar}}| {MAGENTA}{{n_fmt}}/{{total_fmt}} files "
+    f"{{bar}}| {MAGENTA}{{n_fmt}}/{{total_fmt}} descriptions "
     f"{GOLDEN}[{{elapsed}}<{{remaining}}, {{rate_fmt}}{{postfix}}]{RESET}"
 )
 
 
-# embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-#     model_name="all-mpnet-base-v2"
-# )
-embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model_name="text-embedding-3-small"
-)
-
-
 def is_code_file(file_path):
     # List of common code file extensions
     code_extensions = {
@@ -66,135 +58,158 @@ def collect_file_pathes(work_dir):
     under the work_dir according to is_code_file criteria and .coderignore patterns.
     """
     allowed_files = []
-    for root, _, files in os.walk(work_dir):
+    # ignored directories are not walked into at all
+    for root, _, files in walk_not_ignored(work_dir):
         for file in files:
             file_path = Path(root) / file
             if not is_code_file(file_path):
                 continue
-            relative_path_str = file_path.relative_to(work_dir).as_posix()
-            if file_folder_ignored(relative_path_str):
-                continue
             allowed_files.append(file_path)
     return allowed_files
 
 
-def write_file_descriptions(file_list):
-    """Writes descriptions of whole files in codebase. Gets list of files to describe and describes files in batches."""
-    coderrules = read_coderrules()
+def description_id(file_path):
+    """Id of file description in vector storage - relative posix path of the file."""
+    return file_path.relative_to(work_dir).as_posix()
 
-    grandparent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-    with open(f"{grandparent_dir}/prompts/describe_files.prompt", "r") as f:
-        files_describe_template = f.read()
-    prompt = ChatPromptTemplate.from_template(files_describe_template)
-
-    llms = init_llms_mini(tools=[], run_name='File Describer')
-    llm = llms[0].with_fallbacks(llms[1:])
-    chain = prompt | llm | StrOutputParser()
 
+def description_path(desc_id):
     description_folder = join_paths(work_dir, '.clean_coder/files_and_folders_descriptions')
-    Path(description_folder).mkdir(parents=True, exist_ok=True)
-    batch_size = 8
-    pbar = tqdm(total=len(file_list), desc=f"[1/2]Describing files", bar_format=bar_format)
-
-    for i in range(0, len(file_list), batch_size):
-        files_iteration = file_list[i:i + batch_size]
-        descriptions = chain.batch([{'coderrules': coderrules, 'code': get_content(file_path)} for file_path in files_iteration])
-
-
-        for file_path, description in zip(files_iteration, descriptions):
-            file_name = file_path.relative_to(work_dir).as_posix().replace('/', '=')
-            output_path = join_paths(description_folder, f"{file_name}.txt")
-
-            with open(output_path, 'w', encoding='utf-8') as out_file:
-                out_file.write(description)
-
-        # Update by actual number of files processed in this batch
-        pbar.update(len(files_iteration))
-
-    pbar.close()  # Don't forget to close the progress bar when done
-
-
-def write_file_chunks_descriptions(file_list):
-    """Writes descriptions of file chunks in codebase. Gets list of whole files to describe, divides files
-    into chunks and describes each chunk separately."""
-
+    return join_paths(description_folder, f"{desc_id.replace('/', '=')}.txt")
+
+
+def get_or_create_collection():
+    from src.tools.rag.embeddings import get_embedding_function, collection_metadata, check_embedding_backend
+    from src.tools.rag.chroma_pool import ChromaPool
+    collection = ChromaPool.get_collection(
+        work_dir,
+        collection_name,
+        get_embedding_function(),
+        # metadata is saved only on creation - it remembers embedding backend index was built with
+        metadata=collection_metadata(),
+        create=True,
+    )
+    if not check_embedding_backend(collection):
+        # vectors of other backend added to collection could not be compared with ones it already has
+        raise Exception("Project files have to be re-indexed with configured EMBEDDING_BACKEND before index is updated.")
+    return collection
+
+
+def write_descriptions(
+        file_list, chunks_to_describe=None, describe_files=True, describe_chunks=True, journal=None, uploader=None):
+    """Writes descriptions of whole files and of their chunks. Jobs of both kinds are described concurrently by
+    DescribingEngine, within rate limits of LLM providers.
+
+    chunks_to_describe: optional dict mapping description id of file to list of chunk numbers to describe.
+    If not provided, all chunks are described.
+    journal: optional IndexingJournal. Descriptions already written according to journal are not described again.
+    uploader: optional StreamingUploader, receiving every description as soon as it is written.
+    Returns ids of descriptions ready on disk."""
     coderrules = read_coderrules()
 
-    grandparent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-    with open(f"{grandparent_dir}/prompts/describe_file_chunks.prompt", "r") as f:
-        chunks_describe_template = f.read()
-
-    prompt = ChatPromptTemplate.from_template(chunks_describe_template)
-    llms = init_llms_mini(tools=[], run_name='File Describer')
-    llm = llms[0]
-    chain = prompt | llm | StrOutputParser()
-
     description_folder = join_paths(work_dir, '.clean_coder/files_and_folders_descriptions')
     Path(description_folder).mkdir(parents=True, exist_ok=True)
 
-    # iterate chunks inside of the file
-    for file_path in tqdm(file_list, desc=f"[2/2]Describing file chunks",
-
-                 bar_format=bar_format):
+    jobs = []
+    for file_path in file_list:
         file_content = get_content(file_path)
+        desc_id = description_id(file_path)
+        if describe_files:
+            jobs.append(DescriptionJob(
+                desc_id,
+                "describe_files",
+                {'coderrules': coderrules, 'code': file_content},
+                source_hash=content_hash(file_content),
+            ))
+        if not describe_chunks:
+            continue
         # get file extenstion
         extension = file_path.suffix.lstrip('.')
         file_chunks = split_code(file_content, extension)
         # do not describe chunk of 1-chunk files
         if len(file_chunks) <= 1:
             continue
-        descriptions = chain.batch([{'coderrules': coderrules, 'file_code': file_content, 'chunk_code': chunk} for chunk in file_chunks])
+        chunk_nrs = range(len(file_chunks)) if chunks_to_describe is None else chunks_to_describe.get(desc_id, [])
+        for nr in chunk_nrs:
+            jobs.append(DescriptionJob(
+                chunk_id(desc_id, nr),
+                "describe_file_chunks",
+                {'coderrules': coderrules, 'file_code': file_content, 'chunk_code': file_chunks[nr]},
+                source_hash=content_hash(file_chunks[nr]),
+            ))
+
+    ready_ids = []
+    if journal:
+        ready_ids = [job.desc_id for job in jobs if journal.is_described(job.desc_id, job.source_hash)]
+        jobs = [job for job in jobs if not journal.is_described(job.desc_id, job.source_hash)]
+        if ready_ids:
+            print_formatted(f"Resuming indexing: {len(ready_ids)} descriptions already done.", color='magenta')
+
+    pbar = tqdm(total=len(jobs), desc=f"Describing files", bar_format=bar_format)
+
+    def save_description(job, description):
+        with open(description_path(job.desc_id), 'w', encoding='utf-8') as out_file:
+            out_file.write(description)
+        if journal:
+            journal.record_described(job.desc_id, job.source_hash)
+        if uploader:
+            uploader.add(job.desc_id, description)
+        ready_ids.append(job.desc_id)
+        pbar.update(1)
+
+    DescribingEngine(run_name='File Describer').run(jobs, save_description)
+    pbar.close()
+    return ready_ids
 
-        for nr, description in enumerate(descriptions):
-            file_name = f"{file_path.relative_to(work_dir).as_posix().replace('/', '=')}_chunk{nr}"
-            output_path = join_paths(description_folder, f"{file_name}.txt")
 
-            with open(output_path, 'w', encoding='utf-8') as out_file:
-                out_file.write(description)
+def write_file_descriptions(file_list):
+    """Writes descriptions of whole files in codebase. Returns ids of written descriptions."""
+    return write_descriptions(file_list, describe_chunks=False)
 
 
-def upload_descriptions_to_vdb():
-    """Uploads descriptions, created by write_file_chunks_descriptions, into vector database."""
-    print_formatted("Uploading file descriptions to vector storage...", color='magenta')
-    chroma_client = chromadb.PersistentClient(path=join_paths(work_dir, '.clean_coder/chroma_base'))
-    collection_name = f"clean_coder_{Path(work_dir).name}_file_descriptions"
+def write_file_chunks_descriptions(file_list, chunks_to_describe=None):
+    """Writes descriptions of file chunks in codebase. Gets list of whole files to describe, divides files
+    into chunks and describes each chunk separately. Returns ids of written descriptions."""
+    return write_descriptions(file_list, chunks_to_describe, describe_files=False)
 
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        #embedding_function=embedding_function
 
-    )
+def upload_descriptions_to_vdb(description_ids=None, journal=None):
+    """Uploads descriptions, created by write_file_chunks_descriptions, into vector database.
+    If description_ids provided, uploads only that descriptions instead of whole descriptions folder.
+    If journal provided, every uploaded batch is recorded in it."""
+    if description_ids == []:
+        return
+    print_formatted("Uploading file descriptions to vector storage...", color='magenta')
+    uploader = StreamingUploader(get_or_create_collection(), journal=journal)
 
     # read files and upload to base
     description_folder = join_paths(work_dir, '.clean_coder/files_and_folders_descriptions')
+    if description_ids is None:
+        description_files = [Path(root) / file for root, _, files in os.walk(description_folder) for file in files]
+    else:
+        description_files = [Path(description_path(desc_id)) for desc_id in description_ids]
 
-    docs = []
-    ids = []
+    for file_path in description_files:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        uploader.add(file_path.name.replace('=', '/').removesuffix(".txt"), content)
+    uploader.close()
 
-    for root, _, files in os.walk(description_folder):
-        for file in files:
-            file_path = Path(root) / file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            docs.append(content)
-            ids.append(file_path.name.replace('=', '/').removesuffix(".txt"))
-            # upsert to vector storage by batches of 100
-            if len(docs) >= 100:
-                collection.upsert(documents=docs, ids=ids)
-                # Clear the batch lists
-                docs = []
-                ids = []
-    # upsert remaining docs
-    collection.upsert(documents=docs, ids=ids)
+
+def remove_descriptions(description_ids):
+    """Removes descriptions of deleted files (or not existing anymore chunks) from disk and vector database."""
+    if not description_ids:
+        return
+    collection = get_or_create_collection()
+    collection.delete(ids=description_ids)
+    get_ranking_cache(work_dir).invalidate(description_ids)
+    for desc_id in description_ids:
+        if os.path.exists(description_path(desc_id)):
+            os.remove(description_path(desc_id))
 
 
 def upsert_file_list(file_list):
-    chroma_client = chromadb.PersistentClient(path=join_paths(work_dir, '.clean_coder/chroma_base'))
-    collection_name = f"clean_coder_{Path(work_dir).name}_file_descriptions"
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        #embedding_function=embedding_function
-    )
+    collection = get_or_create_collection()
 
     descriptions_folder = join_paths(work_dir, '.clean_coder/files_and_folders_descriptions')
 
@@ -210,17 +225,94 @@ def upsert_file_list(file_list):
             docs.append(content)
             ids.append(file_path.name.replace('=', '/').removesuffix(".txt"))
 
-    collection.upsert(documents=docs, ids=ids)
+    if docs:
+        collection.upsert(documents=docs, ids=ids)
+        get_ranking_cache(work_dir).invalidate(ids)
+        update_lexical_index(
+            [Path(join_paths(work_dir, file.filename)) for file in file_list if os.path.exists(join_paths(work_dir, file.filename))],
+            ids,
+        )
     print_formatted("Re-indexing of modified files completed.", color='green')
 
 
+def update_lexical_index(file_list, description_ids, removed_ids=()):
+    """Adds descriptions together with source code of described files and chunks to the lexical (BM25) index."""
+    lexical_index = LexicalIndex(join_paths(work_dir, '.clean_coder/lexical_index.json'))
+    if not lexical_index.exists():
+        # index created before lexical search - index all its descriptions first, not only updated ones
+        lexical_index.fill_from_collection(get_or_create_collection())
+    description_ids = set(description_ids)
+    for file_path in file_list:
+        file_content = get_content(file_path)
+        desc_id = description_id(file_path)
+        sources = {desc_id: file_content}
+        file_chunks = split_code(file_content, file_path.suffix.lstrip('.'))
+        if len(file_chunks) > 1:
+            sources.update({chunk_id(desc_id, nr): chunk for nr, chunk in enumerate(file_chunks)})
+        for doc_id, source in sources.items():
+            if doc_id not in description_ids or not os.path.exists(description_path(doc_id)):
+                continue
+            with open(description_path(doc_id), 'r', encoding='utf-8') as f:
+                description = f.read()
+            lexical_index.update(doc_id, description + "\n\n" + source)
+    for doc_id in removed_ids:
+        lexical_index.remove(doc_id)
+    lexical_index.save()
+
+
+def plan_incremental_indexing(file_list, manifest):
+    """
+    Compares files with index manifest. Returns files which content changed, numbers of their chunks to describe,
+    ids of descriptions to remove and new manifest entries to save after indexing. Only files which modification
+    time or size differ from manifest are read.
+    """
+    changed_files = []
+    chunks_to_describe = {}
+    ids_to_remove = []
+    new_entries = {}
+    for file_path in file_list:
+        desc_id = description_id(file_path)
+        stat = file_stat(file_path)
+        # file not modified since indexing is not even read
+        if manifest.stat_unchanged(desc_id, stat):
+            continue
+        file_content = get_content(file_path)
+        file_hash = content_hash(file_content)
+        if not manifest.file_changed(desc_id, file_hash):
+            manifest.refresh_stat(desc_id, stat)
+            continue
+        file_chunks = split_code(file_content, file_path.suffix.lstrip('.'))
+        # 1-chunk files have no chunk descriptions
+        chunk_hashes = [content_hash(chunk) for chunk in file_chunks] if len(file_chunks) > 1 else []
+        changed_files.append(file_path)
+        chunks_to_describe[desc_id] = manifest.changed_chunks(desc_id, chunk_hashes)
+        ids_to_remove.extend(manifest.stale_chunk_ids(desc_id, len(chunk_hashes)))
+        new_entries[desc_id] = (file_hash, chunk_hashes, stat)
+
+    for removed_file_id in manifest.removed_files(description_id(file_path) for file_path in file_list):
+        ids_to_remove.extend(manifest.description_ids(removed_file_id))
+        new_entries[removed_file_id] = None
+
+    return changed_files, chunks_to_describe, ids_to_remove, new_entries
+
+
 def prompt_index_project_files():
     """
     Checks if the vector database (VDB) is available.
     If not, prompts the user via questionary to index project files for better search.
     Then asks if yous sure he want to do indexing. Then triggers write_and_index_descriptions().
+    If VDB is available, offers re-indexing of files changed since the last indexing.
     """
+    if IndexingJournal(work_dir).exists():
+        prompt_resume_indexing()
+        return
+    from src.tools.rag.embeddings import embedding_backend_matches
+    collection = open_collection()
+    if collection and not embedding_backend_matches(collection):
+        prompt_reembed_descriptions(collection)
+        return
     if vdb_available():
+        prompt_reindex_changed_files()
         return
     answer = questionary.select(
         "Do you want to index your project files for improving file search?",
@@ -240,15 +332,125 @@ def prompt_index_project_files():
             write_and_index_descriptions(all_files)
 
 
-def write_and_index_descriptions(file_list):
-    #provide optionally which subfolders needs to be checked, if you don't want to describe all project folder
-    write_file_descriptions(file_list)
-    write_file_chunks_descriptions(file_list)
+def prompt_resume_indexing():
+    """Asks user to continue indexing interrupted during previous run."""
+    answer = questionary.select(
+        "Previous indexing of project files has been interrupted. Do you want to resume it?",
+        choices=["Resume", "Skip"],
+        style=QUESTIONARY_STYLE,
+        instruction="\nHint: Already written descriptions will not be described again."
+    ).ask()
+    if answer == "Resume":
+        write_and_index_descriptions(collect_file_pathes(work_dir))
 
 
+def prompt_reembed_descriptions(collection):
+    """Asks user to embed descriptions again, as project was indexed with other embedding backend than configured."""
+    from src.tools.rag.embeddings import get_embedding_function, indexed_backend
+    answer = questionary.select(
+        f"Project files were indexed with '{indexed_backend(collection)}' embeddings, but "
+        f"'{get_embedding_function().backend_name}' is configured. Do you want to re-index them?",
+        choices=["Re-index", "Skip"],
+        style=QUESTIONARY_STYLE,
+        instruction="\nHint: Written descriptions are only embedded again, not described. Vector search is off until re-indexing."
+    ).ask()
+    if answer == "Re-index":
+        reembed_descriptions()
+
+
+def reembed_descriptions():
+    """Recreates vector storage collection with configured embedding backend and uploads all written descriptions."""
+    from src.tools.rag.chroma_pool import ChromaPool
+    ChromaPool.delete_collection(work_dir, collection_name)
     upload_descriptions_to_vdb()
 
 
+def prompt_reindex_changed_files():
+    """Asks user to update index if project files changed since last indexing."""
+    manifest = IndexManifest(work_dir)
+    all_files = collect_file_pathes(work_dir)
+    # index created before manifest been introduced - no way to know what changed since it was built
+    if not manifest.exists():
+        prompt_create_manifest(manifest, all_files)
+        return
+    changed_files, _, ids_to_remove, _ = plan_incremental_indexing(all_files, manifest)
+    if manifest.stats_refreshed:
+        manifest.save()
+    if not changed_files and not ids_to_remove:
+        return
+    answer = questionary.select(
+        f"{len(changed_files)} files changed since last indexing. Do you want to update index?",
+        choices=["Update", "Skip"],
+        style=QUESTIONARY_STYLE,
+    ).ask()
+    if answer == "Update":
+        write_and_index_descriptions(all_files)
+
+
+def prompt_create_manifest(manifest, file_list):
+    """Asks user to start tracking changes of files for index created before index manifest been introduced."""
+    answer = questionary.select(
+        "Project index doesn't track file changes yet. Do you want to start tracking them to update index later?",
+        choices=["Track", "Skip"],
+        style=QUESTIONARY_STYLE,
+        instruction="\nHint: Current files are assumed to be indexed and are not described again."
+    ).ask()
+    if answer == "Track":
+        create_manifest(manifest, file_list)
+
+
+def create_manifest(manifest, file_list):
+    """
+    Records hashes of current content of already described files in manifest, without describing them again.
+    Files without description are left out of manifest, so they will be described during next indexing.
+    """
+    for file_path in file_list:
+        desc_id = description_id(file_path)
+        if not os.path.exists(description_path(desc_id)):
+            continue
+        file_content = get_content(file_path)
+        file_chunks = split_code(file_content, file_path.suffix.lstrip('.'))
+        # chunks described only if their descriptions exist; otherwise all of them will be described on file change
+        chunks_described = len(file_chunks) > 1 and os.path.exists(description_path(chunk_id(desc_id, 0)))
+        chunk_hashes = [content_hash(chunk) for chunk in file_chunks] if chunks_described else []
+        manifest.update(desc_id, content_hash(file_content), chunk_hashes, file_stat(file_path))
+    manifest.save()
+
+
+def write_and_index_descriptions(file_list):
+    """
+    Describes and uploads to vector storage only files (and chunks) changed since last indexing, and removes
+    descriptions of files not existing anymore. file_list should contain all project files to be indexed.
+    Progress is recorded in indexing journal, so interrupted indexing skips finished work when started again.
+    """
+    #provide optionally which subfolders needs to be checked, if you don't want to describe all project folder
+    manifest = IndexManifest(work_dir)
+    journal = IndexingJournal(work_dir)
+    changed_files, chunks_to_describe, ids_to_remove, new_entries = plan_incremental_indexing(file_list, manifest)
+
+    # descriptions are uploaded to vector storage as soon as they are written
+    uploader = StreamingUploader(get_or_create_collection(), journal=journal)
+    written_ids = write_descriptions(changed_files, chunks_to_describe, journal=journal, uploader=uploader)
+    uploader.close()
+    # relevance verdicts for old versions of descriptions are useless now
+    get_ranking_cache(work_dir).invalidate(written_ids)
+
+    # descriptions written during interrupted run, but not uploaded before interruption
+    upload_descriptions_to_vdb([desc_id for desc_id in written_ids if not journal.is_uploaded(desc_id)], journal=journal)
+    remove_descriptions(ids_to_remove)
+    update_lexical_index(changed_files, written_ids, ids_to_remove)
+
+    written_ids = set(written_ids)
+    for desc_id, entry in new_entries.items():
+        if entry is None:
+            manifest.remove(desc_id)
+        # files which descriptions failed stay not indexed in manifest, to be described during next indexing
+        elif desc_id in written_ids and all(chunk_id(desc_id, nr) in written_ids for nr in chunks_to_describe[desc_id]):
+            manifest.update(desc_id, *entry)
+    manifest.save()
+    journal.finish()
+
+
 if __name__ == "__main__":
     #upload_descriptions_to_vdb()
     upsert_file_list(["src/agents/debugger_agent.py",])
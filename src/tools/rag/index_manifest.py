@@ -0,0 +1,95 @@
+"""
+Manifest of content hashes of indexed files. Stored in .clean_coder/index_manifest.json, it allows to re-describe
+and re-upload to vector storage only files (and file chunks) that changed since the last indexing. Modification time
+and size of every file are stored too, so only files which stat changed need to be read and hashed to find changes.
+"""
+import os
+import json
+import hashlib
+from src.utilities.util_functions import join_paths
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_stat(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def chunk_id(file_id, nr):
+    return f"{file_id}_chunk{nr}"
+
+
+class IndexManifest:
+    """
+    Maps every indexed file (relative posix path, same as its description id) to the hash of its content, the list
+    of hashes of its chunks and its stat (modification time and size). Chunk hashes are stored only for files which
+    chunks were described.
+    """
+    def __init__(self, work_dir):
+        self.path = join_paths(work_dir, '.clean_coder/index_manifest.json')
+        self.entries = self.load()
+        # stats of files which content turned out unchanged were updated, and are worth saving
+        self.stats_refreshed = False
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            # corrupted manifest means we can't trust it - everything will be indexed again
+            return {}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def stat_unchanged(self, file_id, stat):
+        entry = self.entries.get(file_id)
+        return entry is not None and entry.get("stat") == stat
+
+    def refresh_stat(self, file_id, stat):
+        """Records new stat of file which content did not change, so it's not read again next time."""
+        self.entries[file_id]["stat"] = stat
+        self.stats_refreshed = True
+
+    def file_changed(self, file_id, file_hash):
+        entry = self.entries.get(file_id)
+        return entry is None or entry["hash"] != file_hash
+
+    def changed_chunks(self, file_id, chunk_hashes):
+        """Returns numbers of chunks which content differs from the indexed one."""
+        old_hashes = self.entries.get(file_id, {}).get("chunks", [])
+        return [
+            nr for nr, chunk_hash in enumerate(chunk_hashes)
+            if nr >= len(old_hashes) or old_hashes[nr] != chunk_hash
+        ]
+
+    def stale_chunk_ids(self, file_id, new_chunks_count):
+        """Returns ids of chunk descriptions which not exist anymore after file got fewer chunks."""
+        old_chunks_count = len(self.entries.get(file_id, {}).get("chunks", []))
+        return [chunk_id(file_id, nr) for nr in range(new_chunks_count, old_chunks_count)]
+
+    def removed_files(self, current_file_ids):
+        current_file_ids = set(current_file_ids)
+        return [file_id for file_id in self.entries if file_id not in current_file_ids]
+
+    def description_ids(self, file_id):
+        """Returns ids of all descriptions (whole file and chunks) stored for the file."""
+        chunks_count = len(self.entries.get(file_id, {}).get("chunks", []))
+        return [file_id] + [chunk_id(file_id, nr) for nr in range(chunks_count)]
+
+    def update(self, file_id, file_hash, chunk_hashes, stat=None):
+        self.entries[file_id] = {"hash": file_hash, "chunks": chunk_hashes, "stat": stat}
+
+    def remove(self, file_id):
+        self.entries.pop(file_id, None)
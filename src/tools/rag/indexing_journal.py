@@ -0,0 +1,66 @@
+"""
+Journal of indexing in progress. Every finished description and every upload to vector storage is appended as
+a line to .clean_coder/indexing_journal.jsonl, so indexing run interrupted by crash or rate limits can be continued
+from where it stopped. Journal is removed when indexing finishes.
+"""
+import os
+import json
+import threading
+from src.utilities.util_functions import join_paths
+
+
+class IndexingJournal:
+    def __init__(self, work_dir):
+        self.path = join_paths(work_dir, '.clean_coder/indexing_journal.jsonl')
+        # description id -> hash of described content
+        self.described = {}
+        # description id -> hash of content which description was uploaded
+        self.uploaded = {}
+        # descriptions and uploads are recorded from different threads
+        self.lock = threading.Lock()
+        self.load()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not self.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line could be written partially during crash
+                    continue
+                if record["event"] == "described":
+                    self.described[record["id"]] = record["hash"]
+                elif record["event"] == "uploaded":
+                    for desc_id in record["ids"]:
+                        self.uploaded[desc_id] = self.described.get(desc_id)
+
+    def append(self, record):
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def record_described(self, desc_id, source_hash):
+        self.described[desc_id] = source_hash
+        self.append({"event": "described", "id": desc_id, "hash": source_hash})
+
+    def record_uploaded(self, desc_ids):
+        for desc_id in desc_ids:
+            self.uploaded[desc_id] = self.described.get(desc_id)
+        self.append({"event": "uploaded", "ids": desc_ids})
+
+    def is_described(self, desc_id, source_hash):
+        """Description is valid only if content didn't change since it been written."""
+        return self.described.get(desc_id) == source_hash
+
+    def is_uploaded(self, desc_id):
+        return desc_id in self.uploaded and self.uploaded[desc_id] == self.described.get(desc_id)
+
+    def finish(self):
+        if self.exists():
+            os.remove(self.path)
+        self.described = {}
+        self.uploaded = {}
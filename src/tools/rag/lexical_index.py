@@ -0,0 +1,134 @@
+"""
+Local BM25 index of file descriptions together with raw source code of files and chunks, stored in
+.clean_coder/lexical_index.json. Complements vector search with exact matches of identifiers (function names,
+endpoint paths, etc.), which embeddings often miss.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from src.utilities.util_functions import join_paths
+
+
+K1 = 1.5
+B = 0.75
+# constant of reciprocal rank fusion, damping influence of top positions
+RRF_K = 60
+
+
+def tokenize(text):
+    """Lowercased identifiers and paths, plus words they consist of (snake_case, camelCase, path segments)."""
+    tokens = []
+    for token in re.findall(r"/?[A-Za-z0-9_][A-Za-z0-9_\-./]*", text):
+        token = token.rstrip("./-")
+        tokens.append(token.lower())
+        parts = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", token)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def is_identifier_query(query):
+    """Query being single identifier or path, like get_user_profile, UserProfile or /api/users."""
+    query = query.strip()
+    if not re.fullmatch(r"/?[A-Za-z_][A-Za-z0-9_\-./]*", query):
+        return False
+    return bool(re.search(r"[_/.]|[a-z][A-Z]", query))
+
+
+def reciprocal_rank_fusion(rankings, n_results):
+    """Fuses lists of document ids ordered by relevance into one list."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking):
+            scores[doc_id] += 1 / (RRF_K + position + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+
+class LexicalIndex:
+    def __init__(self, path):
+        self.path = path
+        # document id -> term frequencies
+        self.documents = {}
+        self.postings = None
+        self.load()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not self.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            self.documents = {}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.documents, f)
+        os.replace(tmp_path, self.path)
+
+    def update(self, doc_id, text):
+        # path of file is searchable too
+        self.documents[doc_id] = dict(Counter(tokenize(doc_id) + tokenize(text)))
+        self.postings = None
+
+    def fill_from_collection(self, collection):
+        """Indexes descriptions stored in vector collection - for indexes created before lexical search been
+        introduced, which have no lexical index file."""
+        stored = collection.get(include=["documents"])
+        for doc_id, document in zip(stored["ids"], stored["documents"]):
+            self.update(doc_id, document)
+
+    def remove(self, doc_id):
+        self.documents.pop(doc_id, None)
+        self.postings = None
+
+    def build_postings(self):
+        self.postings = defaultdict(list)
+        self.doc_lengths = {}
+        for doc_id, terms in self.documents.items():
+            self.doc_lengths[doc_id] = sum(terms.values())
+            for term, frequency in terms.items():
+                self.postings[term].append((doc_id, frequency))
+        self.avg_doc_length = sum(self.doc_lengths.values()) / len(self.doc_lengths) if self.doc_lengths else 0
+
+    def search(self, query, n_results):
+        """Returns ids of best matching documents, ordered by BM25 score."""
+        if self.postings is None:
+            self.build_postings()
+        scores = defaultdict(float)
+        docs_count = len(self.documents)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term, [])
+            if not postings:
+                continue
+            idf = math.log(1 + (docs_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                length_norm = 1 - B + B * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] += idf * frequency * (K1 + 1) / (frequency + K1 * length_norm)
+        return sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+    def exact_matches(self, identifier, n_results):
+        """Returns ids of documents containing identifier as whole token, most occurrences first."""
+        if self.postings is None:
+            self.build_postings()
+        postings = self.postings.get(identifier.strip().rstrip("./-").lower(), [])
+        return [doc_id for doc_id, _ in sorted(postings, key=lambda posting: posting[1], reverse=True)[:n_results]]
+
+
+_lexical_indexes = {}
+
+
+def get_lexical_index(work_dir):
+    """Returns index of work dir, loaded once and reloaded only when file on disk changed."""
+    path = join_paths(work_dir, ".clean_coder/lexical_index.json")
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cached = _lexical_indexes.get(path)
+    if cached is None or cached[1] != mtime:
+        _lexical_indexes[path] = (LexicalIndex(path), mtime)
+    return _lexical_indexes[path][0]
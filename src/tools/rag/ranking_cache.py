@@ -0,0 +1,109 @@
+"""
+Persistent cache of BinaryRanker verdicts, stored in .clean_coder/ranking_cache.sqlite. Verdict is keyed by
+normalized query and hash of document (file description) content, so when description changes old verdicts
+stop matching. Entries expire after TTL and least recently used ones are evicted when cache grows too big.
+"""
+import re
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from src.utilities.util_functions import join_paths
+
+
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 5000
+
+
+def normalize_query(query):
+    """Lowercased words of query in original order; differences in whitespace and punctuation are skipped."""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def document_hash(document):
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+class RankingCache:
+    def __init__(self, work_dir):
+        self.connection = sqlite3.connect(
+            join_paths(work_dir, ".clean_coder/ranking_cache.sqlite"), check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts (query TEXT, filename TEXT, document_hash TEXT, "
+                "is_relevant INTEGER, reasoning TEXT, created_at REAL, used_at REAL, "
+                "PRIMARY KEY (query, filename, document_hash))"
+            )
+            self.connection.commit()
+
+    def get(self, query, filename, document):
+        """Returns (is_relevant, reasoning) or None if verdict not cached or expired."""
+        key = (normalize_query(query), filename, document_hash(document))
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT is_relevant, reasoning FROM verdicts "
+                "WHERE query = ? AND filename = ? AND document_hash = ? AND created_at > ?",
+                (*key, now - TTL_SECONDS),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE verdicts SET used_at = ? WHERE query = ? AND filename = ? AND document_hash = ?", (now, *key)
+            )
+            self.connection.commit()
+        return bool(row[0]), row[1]
+
+    def put(self, query, filename, document, is_relevant, reasoning):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_query(query), filename, document_hash(document), int(is_relevant), reasoning, now, now),
+            )
+            self.connection.commit()
+
+    def evict(self):
+        """Removes expired verdicts and least recently used ones above size limit."""
+        with self.lock:
+            self.connection.execute("DELETE FROM verdicts WHERE created_at <= ?", (time.time() - TTL_SECONDS,))
+            self.connection.execute(
+                "DELETE FROM verdicts WHERE rowid IN "
+                "(SELECT rowid FROM verdicts ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (MAX_ENTRIES,),
+            )
+            self.connection.commit()
+
+    def invalidate(self, filenames):
+        """Removes verdicts for documents which descriptions changed or been removed."""
+        filenames = list(filenames)
+        with self.lock:
+            for i in range(0, len(filenames), 500):
+                filenames_part = filenames[i:i + 500]
+                placeholders = ",".join("?" * len(filenames_part))
+                self.connection.execute(f"DELETE FROM verdicts WHERE filename IN ({placeholders})", filenames_part)
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_ranking_caches = {}
+
+
+def get_ranking_cache(work_dir):
+    """Returns cache of work dir; its database connection is opened once and shared by all rankers."""
+    if work_dir not in _ranking_caches:
+        _ranking_caches[work_dir] = RankingCache(work_dir)
+    return _ranking_caches[work_dir]
+
+
+@atexit.register
+def close_ranking_caches():
+    for cache in _ranking_caches.values():
+        cache.close()
+    _ranking_caches.clear()
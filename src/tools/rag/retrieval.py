@@ -1,8 +1,10 @@
 import os
-import chromadb
 from pathlib import Path
 from dotenv import load_dotenv, find_dotenv
 from src.utilities.llms import init_llms_mini
+from src.utilities.util_functions import join_paths
+from src.tools.rag.ranking_cache import get_ranking_cache
+from src.tools.rag.lexical_index import get_lexical_index, reciprocal_rank_fusion, is_identifier_query
 from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
@@ -11,6 +13,10 @@ from pydantic import BaseModel, Field
 load_dotenv(find_dotenv())
 work_dir = os.getenv("WORK_DIR")
 collection_name = f"clean_coder_{Path(work_dir).name}_file_descriptions"
+# Squared L2 distances of normalized embeddings (0 - identical, 2 - orthogonal) used in threshold ranking mode.
+DEFAULT_ACCEPT_DISTANCE = 0.6
+DEFAULT_REJECT_DISTANCE = 1.4
+
 
 class BinaryRankingResult(BaseModel):
     """Structured output for binary document ranking. First analyze and provide reasoning, then make decision."""
@@ -22,24 +28,199 @@ class BinaryRankingResult(BaseModel):
     )
 
 
-def get_collection():
-    chroma_client = chromadb.PersistentClient(path=os.getenv('WORK_DIR') + '/.clean_coder/chroma_base')
-    from chromadb.utils import embedding_functions
-    embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        model_name="text-embedding-3-small"
-    )
+def open_collection():
+    """Returns collection of project, whichever embedding backend it was indexed with, or False if not indexed."""
+    # chromadb takes long to import - it's not imported at all for projects without index
+    if not os.path.isdir(join_paths(os.getenv('WORK_DIR'), '.clean_coder/chroma_base')):
+        return False
+    from src.tools.rag.embeddings import get_embedding_function
+    from src.tools.rag.chroma_pool import ChromaPool
     try:
-        return chroma_client.get_collection(name=collection_name)#, embedding_function=embedding_function)
+        return ChromaPool.get_collection(os.getenv('WORK_DIR'), collection_name, get_embedding_function())
     except:
         # print("Vector database does not exist. (Optional) create it by running src/tools/rag/write_descriptions.py to improve file research capabilities")
         return False
 
 
+def get_collection():
+    """Returns collection of project if it can be queried with configured embedding backend, otherwise False."""
+    collection = open_collection()
+    if not collection:
+        return False
+    from src.tools.rag.embeddings import check_embedding_backend
+    return collection if check_embedding_backend(collection) else False
+
+
 def vdb_available():
     return True if get_collection() else False
 
 
+def get_lexical_index_of(collection):
+    """Returns lexical index of project, built from descriptions stored in collection if it has no index file."""
+    lexical_index = get_lexical_index(os.getenv('WORK_DIR'))
+    if not lexical_index.exists():
+        lexical_index.fill_from_collection(collection)
+        lexical_index.save()
+    return lexical_index
+
+
+def hybrid_search(question, collection, n_results=8):
+    """
+    Searches by vector similarity and by BM25 lexical index; fuses both result lists with reciprocal rank fusion.
+    Returns retrieval in format of collection.query.
+    """
+    return hybrid_search_many([question], collection, n_results)[0]
+
+
+def hybrid_search_many(questions, collection, n_results=8):
+    """
+    Hybrid search of many questions at once: all questions are embedded in one batch and sent to vector storage
+    in one query. Returns list of retrievals, one per question.
+    """
+    vector_retrieval = collection.query(query_texts=questions, n_results=n_results)
+    lexical_index = get_lexical_index_of(collection)
+    documents = {}
+    distances_per_question = []
+    fused_ids_per_question = []
+    for question_nr, question in enumerate(questions):
+        vector_ids = vector_retrieval["ids"][question_nr]
+        documents.update(zip(vector_ids, vector_retrieval["documents"][question_nr]))
+        distances_per_question.append(dict(zip(vector_ids, vector_retrieval["distances"][question_nr])))
+        lexical_ids = lexical_index.search(question, n_results)
+        fused_ids_per_question.append(reciprocal_rank_fusion([vector_ids, lexical_ids], n_results))
+
+    # documents found by lexical search only, for all questions at once
+    fetch_missing_documents(collection, documents, [doc_id for ids in fused_ids_per_question for doc_id in ids])
+    return [
+        retrieval_by_ids(collection, fused_ids, documents, distances)
+        for fused_ids, distances in zip(fused_ids_per_question, distances_per_question)
+    ]
+
+
+def fetch_missing_documents(collection, documents, ids):
+    missing_ids = list(dict.fromkeys(doc_id for doc_id in ids if doc_id not in documents))
+    if missing_ids:
+        stored = collection.get(ids=missing_ids, include=["documents"])
+        documents.update(zip(stored["ids"], stored["documents"]))
+
+
+def retrieval_by_ids(collection, ids, documents=None, distances=None):
+    """Builds retrieval in format of collection.query for provided ids, getting documents not provided in documents
+    dict from collection. Vector distances are known only for documents in distances dict; for others it is None."""
+    documents = dict(documents or {})
+    distances = distances or {}
+    fetch_missing_documents(collection, documents, ids)
+    # lexical index could contain ids already removed from collection
+    ids = [doc_id for doc_id in ids if doc_id in documents]
+    return {
+        "ids": [ids],
+        "documents": [[documents[doc_id] for doc_id in ids]],
+        "distances": [[distances.get(doc_id) for doc_id in ids]],
+    }
+
+
+def rank_retrievals(questions, retrievals, binary_ranker):
+    """
+    Ranks retrievals of all questions in one batched LLM pass. In threshold ranking mode documents very close to
+    the question are accepted and distant ones rejected by their vector distance; only documents in between (or found
+    by lexical search only, without distance) are ranked by LLM.
+    Returns list of rankings in format of BinaryRanker.rank and list of thresholds usage reports (None in default
+    mode), one per question.
+    """
+    use_thresholds = os.getenv("RETRIEVAL_RANKING_MODE") == "threshold"
+    if use_thresholds:
+        accept_distance = float(os.getenv("RETRIEVAL_ACCEPT_DISTANCE") or DEFAULT_ACCEPT_DISTANCE)
+        reject_distance = float(os.getenv("RETRIEVAL_REJECT_DISTANCE") or DEFAULT_REJECT_DISTANCE)
+
+    verdicts = [{} for _ in questions]
+    reports = []
+    # (question number, document id, document) pairs to be ranked by LLM
+    pairs_to_rank = []
+    for question_nr, retrieval in enumerate(retrievals):
+        ids = retrieval["ids"][0]
+        ambiguous_count = 0
+        for idx, distance in enumerate(retrieval["distances"][0]):
+            if use_thresholds and distance is not None and distance <= accept_distance:
+                verdicts[question_nr][ids[idx]] = True
+            elif use_thresholds and distance is not None and distance >= reject_distance:
+                verdicts[question_nr][ids[idx]] = False
+            else:
+                pairs_to_rank.append((question_nr, ids[idx], retrieval["documents"][0][idx]))
+                ambiguous_count += 1
+        accepted_count = sum(verdicts[question_nr].values())
+        rejected_count = len(verdicts[question_nr]) - accepted_count
+        reports.append(
+            f"Ranking: {accepted_count} documents auto-accepted (distance <= {accept_distance}), "
+            f"{rejected_count} auto-rejected (distance >= {reject_distance}), {ambiguous_count} ranked by LLM."
+            if use_thresholds else None
+        )
+
+    if pairs_to_rank:
+        results = binary_ranker.rank_pairs(
+            [(questions[question_nr], doc_id, document) for question_nr, doc_id, document in pairs_to_rank]
+        )
+        for (question_nr, doc_id, _), is_relevant in zip(pairs_to_rank, results):
+            verdicts[question_nr][doc_id] = is_relevant
+
+    rankings = [
+        [(doc_id, question_verdicts[doc_id]) for doc_id in retrieval["ids"][0]]
+        for retrieval, question_verdicts in zip(retrievals, verdicts)
+    ]
+    return rankings, reports
+
+
+def search_and_rank(questions, collection):
+    """Returns list of (relevant filenames, their descriptions, ranking report) for every question."""
+    results = [None] * len(questions)
+    # Identifier or path searched - exact lexical matches answer it without vector search and LLM ranking
+    for question_nr, question in enumerate(questions):
+        if not is_identifier_query(question):
+            continue
+        exact_ids = get_lexical_index_of(collection).exact_matches(question, n_results=8)
+        if exact_ids:
+            exact_retrieval = retrieval_by_ids(collection, exact_ids)
+            results[question_nr] = (exact_retrieval["ids"][0], exact_retrieval["documents"][0], None)
+
+    questions_to_search = [question for question, result in zip(questions, results) if result is None]
+    if not questions_to_search:
+        return results
+    retrievals = hybrid_search_many(questions_to_search, collection, n_results=8)
+
+    # Use BinaryRanker to filter relevant documents
+    rankings, reports = rank_retrievals(questions_to_search, retrievals, BinaryRanker())
+
+    searched_results = iter(zip(retrievals, rankings, reports))
+    for question_nr, result in enumerate(results):
+        if result is not None:
+            continue
+        retrieval, ranking, report = next(searched_results)
+        # Filter documents that are marked as relevant (True)
+        relevant_filenames = []
+        relevant_descriptions = []
+        for filename, is_relevant in ranking:
+            if is_relevant:
+                # Find the corresponding document in the retrieval results
+                idx = retrieval["ids"][0].index(filename)
+                relevant_filenames.append(filename)
+                relevant_descriptions.append(retrieval["documents"][0][idx])
+        results[question_nr] = (relevant_filenames, relevant_descriptions, report)
+    return results
+
+
+def format_response(filenames, descriptions, ranking_report=None):
+    response = ""
+    for filename, description in zip(filenames, descriptions):
+        response += f"{filename}:\n\n{description}\n\n###\n\n"
+    # If no relevant documents found, return a message
+    if not response:
+        response = "No relevant documents found for your query."
+    else:
+        response += "\n\nRemember to see files before adding to final response!"
+    if ranking_report:
+        response += f"\n\n{ranking_report}"
+    return response
+
+
 def retrieve(question: str) -> str:
     """
     Retrieve files descriptions by semantic query.
@@ -50,27 +231,32 @@ def retrieve(question: str) -> str:
     Returns:
     str: A formatted response with file descriptions of found files.
     """
-    collection = get_collection()
-    retrieval = collection.query(query_texts=[question], n_results=8)
+    filenames, descriptions, ranking_report = search_and_rank([question], get_collection())[0]
+    return format_response(filenames, descriptions, ranking_report)
 
-    # Use BinaryRanker to filter relevant documents
-    binary_ranker = BinaryRanker()
-    ranking_results = binary_ranker.rank(question, retrieval)
 
-    # Filter documents that are marked as relevant (True)
+def retrieve_many(questions: list) -> str:
+    """
+    Retrieve files descriptions for many semantic queries at once, grouped by query. File found by more than one
+    query is described only once.
+    """
     response = ""
-    for filename, is_relevant in ranking_results:
-        if is_relevant:
-            # Find the corresponding document in the retrieval results
-            idx = retrieval["ids"][0].index(filename)
-            description = retrieval["documents"][0][idx]
-            response += f"{filename}:\n\n{description}\n\n###\n\n"
-
-    # If no relevant documents found, return a message
-    if not response:
-        return "No relevant documents found for your query."
-
-    response += "\n\nRemember to see files before adding to final response!"
+    shown_filenames = set()
+    for question, (filenames, descriptions, ranking_report) in zip(
+            questions, search_and_rank(questions, get_collection())):
+        response += f"## Query: {question}\n\n"
+        if not filenames:
+            response += "No relevant documents found for that query.\n\n"
+        for filename, description in zip(filenames, descriptions):
+            if filename in shown_filenames:
+                response += f"{filename}: (described above)\n\n###\n\n"
+            else:
+                response += f"{filename}:\n\n{description}\n\n###\n\n"
+                shown_filenames.add(filename)
+        if ranking_report:
+            response += f"{ranking_report}\n\n"
+    if shown_filenames:
+        response += "Remember to see files before adding to final response!"
     return response
 
 
@@ -92,6 +278,8 @@ class BinaryRanker:
         """
         # Lazy-loaded chain; not initialized until rank() is called.
         self.chain = None
+        # Lazy-loaded cache of relevance verdicts.
+        self.cache = None
 
     def initialize_chain(self):
         """
@@ -130,31 +318,51 @@ class BinaryRanker:
         Returns:
         list: A list of tuples containing document IDs and their binary relevance scores ('0' or '1').
         """
-        # Ensure the chain is initialized (lazy loading)
-        self.initialize_chain()
-        
         # Extract list of documents and their ids from the retrieval result.
         documents_list = retrieval["documents"][0]
         filenames_list = retrieval["ids"][0]
-        
-        # Build input for batch processing: list of dicts containing question, filename, and document.
+        results = self.rank_pairs([(question, filename, doc) for filename, doc in zip(filenames_list, documents_list)])
+        return list(zip(filenames_list, results))
+
+    def rank_pairs(self, pairs: list) -> list:
+        """
+        Decide relevance of every (question, filename, document) pair, in one batch. Verdicts cached for the same
+        (normalized) question and unchanged document are reused; only the rest of pairs is sent to LLM.
+
+        Returns:
+        list: Relevance (bool) of every pair.
+        """
+        if self.cache is None:
+            self.cache = get_ranking_cache(os.getenv("WORK_DIR"))
+
+        # Take cached verdicts; build input for batch processing from the rest of pairs.
+        verdicts = [None] * len(pairs)
         batch_inputs = []
-        for idx, doc in enumerate(documents_list):
+        batch_indexes = []
+        for idx, (question, filename, doc) in enumerate(pairs):
+            cached_verdict = self.cache.get(question, filename, doc)
+            if cached_verdict is not None:
+                verdicts[idx] = cached_verdict[0]
+                continue
             batch_inputs.append({
                 "question": question,
-                "filename": filenames_list[idx],
+                "filename": filename,
                 "document": doc
             })
-            
-        # Use the chain batch function to get structured outputs.
-        results = self.chain.batch(batch_inputs)
-        
-        # Pair each document id with its binary ranking result.
-        ranking = []
-        for idx, result in enumerate(results):
-            ranking.append((filenames_list[idx], result.is_relevant))
-            
-        return ranking
+            batch_indexes.append(idx)
+
+        if batch_inputs:
+            # Ensure the chain is initialized (lazy loading)
+            self.initialize_chain()
+            # Use the chain batch function to get structured outputs.
+            results = self.chain.batch(batch_inputs)
+
+            for idx, result in zip(batch_indexes, results):
+                verdicts[idx] = result.is_relevant
+                self.cache.put(*pairs[idx], result.is_relevant, result.reasoning)
+            self.cache.evict()
+
+        return verdicts
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""
+Streaming upload of descriptions into vector storage. Descriptions are buffered and upserted in background thread
+as soon as batch is big enough, so index becomes usable while describing is still in progress.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Batch is flushed when it reaches any of the limits below. Limiting payload size rather than number of documents
+# keeps embedding requests of long descriptions small and lets batches of short ones grow.
+MAX_BATCH_BYTES = 256 * 1024
+MAX_BATCH_SIZE = 100
+# Seconds after which not full batch is flushed anyway, so slow describing still updates index regularly.
+MAX_BATCH_DELAY = 10
+
+
+class StreamingUploader:
+    def __init__(self, collection, journal=None):
+        self.collection = collection
+        self.journal = journal
+        self.ids = []
+        self.docs = []
+        self.batch_bytes = 0
+        self.batch_started = None
+        # single thread keeps upserts in order and don't block describing event loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def add(self, desc_id, document):
+        if not self.ids:
+            self.batch_started = time.monotonic()
+        self.ids.append(desc_id)
+        self.docs.append(document)
+        self.batch_bytes += len(document.encode('utf-8'))
+        if (
+            self.batch_bytes >= MAX_BATCH_BYTES
+            or len(self.ids) >= MAX_BATCH_SIZE
+            or time.monotonic() - self.batch_started >= MAX_BATCH_DELAY
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self.ids:
+            return
+        self.futures.append(self.executor.submit(self.upsert, self.ids, self.docs))
+        self.ids = []
+        self.docs = []
+        self.batch_bytes = 0
+
+    def upsert(self, ids, docs):
+        self.collection.upsert(documents=docs, ids=ids)
+        if self.journal:
+            self.journal.record_uploaded(ids)
+
+    def close(self):
+        """Uploads remaining descriptions and waits for all upserts. Raises exception of failed upsert if any."""
+        self.flush()
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
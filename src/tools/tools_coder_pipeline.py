@@ -1,12 +1,14 @@
 from langchain_core.tools import tool
 from typing_extensions import Annotated
+from typing import List
 import os
 from dotenv import load_dotenv, find_dotenv
 from src.utilities.syntax_checker_functions import check_syntax
-from src.utilities.start_work_functions import file_folder_ignored
+from src.utilities.start_work_functions import file_folder_ignored, CoderIgnore
 from src.utilities.util_functions import join_paths, WRONG_TOOL_CALL_WORD
 from src.utilities.user_input import user_input
-from src.tools.rag.retrieval import retrieve
+from src.utilities.file_cache import FileCache
+from src.tools.rag.retrieval import retrieve, retrieve_many
 
 
 load_dotenv(find_dotenv())
@@ -36,7 +38,14 @@ List files in directory. Use only for dirs content of which is hidden in the pro
         try:
             if file_folder_ignored(directory):
                 return f"You are not allowed to work with directory {directory}."
-            files = os.listdir(join_paths(work_dir, directory))
+            entries = os.listdir(join_paths(work_dir, directory))
+            prefix = directory.strip('/') + '/' if directory.strip('/. ') else ''
+            allowed_paths = set(CoderIgnore.filter_not_ignored([prefix + entry for entry in entries]))
+            files = [
+                entry for entry in entries if prefix + entry in allowed_paths and not (
+                    os.path.isdir(join_paths(work_dir, directory, entry)) and CoderIgnore.is_dir_ignored(prefix + entry)
+                )
+            ]
 
             return f"Content of directory {directory}:\n" + "\n".join(files)
         except Exception as e:
@@ -45,6 +54,10 @@ List files in directory. Use only for dirs content of which is hidden in the pro
     return list_dir
 
 
+def render_see_file_lines(lines):
+    return "".join(f"{i+1}|{line[:-1]}|{i+1}\n" for i, line in enumerate(lines))
+
+
 def prepare_see_file_tool(work_dir):
     @tool
     def see_file(filename: Annotated[str, "Name and path of file to check."]):
@@ -54,10 +67,7 @@ Check contents of file.
         try:
             if file_folder_ignored(filename):
                 return f"You are not allowed to work with {filename}."
-            with open(join_paths(work_dir, filename), 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-            formatted_lines = [f"{i+1}|{line[:-1]}|{i+1}\n" for i, line in enumerate(lines)]
-            file_content = "".join(formatted_lines)
+            file_content = FileCache.render(join_paths(work_dir, filename), "see_file", render_see_file_lines)
             file_content = filename + ":\n\n" + file_content
 
             return file_content
@@ -79,6 +89,15 @@ Use that function at least once BEFORE calling final response to ensure you foun
     return retrieve(query)
 
 
+@tool
+def retrieve_files_by_semantic_queries(queries: Annotated[List[str], "List of semantic queries, each describing one subject you look for in one sentence. Good query is '<Thing I\'m looking for>', bad query is 'Find a files containing <thing I\'m looking for>'"]):
+    """
+Use that function instead of retrieve_files_by_semantic_query when you look for several different things at once.
+Results are grouped by query.
+"""
+    return retrieve_many(queries)
+
+
 def prepare_insert_code_tool(work_dir):
     @tool
     def insert_code(
@@ -105,6 +124,7 @@ Proper indentation is important.
                 file.seek(0)
                 file.truncate()
                 file.write(file_contents)
+            FileCache.invalidate(join_paths(work_dir, filename))
             return "Code inserted."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
@@ -139,6 +159,7 @@ Exchange entire functions or code blocks at once. Avoid changing functions parti
                 file.seek(0)
                 file.truncate()
                 file.write(file_contents)
+            FileCache.invalidate(join_paths(work_dir, filename))
             return "Code modified."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
@@ -172,6 +193,7 @@ with another tools.
 
             with open(full_path, 'w', encoding='utf-8') as file:
                 file.write(code)
+            FileCache.invalidate(full_path)
             return "File been created successfully."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
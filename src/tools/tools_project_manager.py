@@ -1,12 +1,12 @@
 from langchain.tools import tool
 from typing_extensions import Annotated
-from todoist_api_python.api import TodoistAPI
 import os
 from src.utilities.print_formatters import print_formatted, print_text_snippet
 from src.utilities.manager_utils import actualize_progress_description_file, move_task
 from src.utilities.user_input import user_input
 from src.utilities.graphics import task_completed_animation
-from src.utilities.util_functions import join_paths
+from src.utilities.util_functions import join_paths, create_todoist_api
+from src.utilities.lazy import LazyObject
 from dotenv import load_dotenv, find_dotenv
 from single_task_coder import run_clean_coder_pipeline
 import uuid
@@ -21,7 +21,7 @@ load_dotenv()
 work_dir = os.getenv('WORK_DIR')
 load_dotenv(join_paths(work_dir, ".clean_coder/.env"))
 todoist_api_key = os.getenv('TODOIST_API_KEY')
-todoist_api = TodoistAPI(todoist_api_key)
+todoist_api = LazyObject(create_todoist_api)
 
 
 @tool
@@ -0,0 +1,303 @@
+"""
+Durable checkpoints of agent graphs, stored in .clean_coder/checkpoints.sqlite. State of graph is saved after every
+completed node in thread named after task and agent, so pipeline interrupted by crash or Ctrl+C resumes at last
+completed node when the same task is run again and user decides to resume it, without repeating LLM calls already
+done. Agents that finished are not run again for resumed task, until whole pipeline finishes and checkpoints of task
+are cleared.
+Set AGENT_CHECKPOINTS=off to run agents without checkpoints.
+"""
+import os
+import sqlite3
+import hashlib
+import threading
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id
+)
+from langgraph.checkpoint.serde.types import TASKS
+from src.utilities.print_formatters import print_formatted
+from src.utilities.util_functions import join_paths
+
+
+# older checkpoints of thread are not needed to resume; parent of latest one is kept for its pending sends
+CHECKPOINTS_KEPT_PER_THREAD = 2
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, "
+                "parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS writes (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, "
+                "task_id TEXT, idx INTEGER, channel TEXT, type TEXT, value BLOB, "
+                "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def load_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        return self.connect().execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    def to_tuple(self, thread_id, checkpoint_ns, row):
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self.load_writes(thread_id, checkpoint_ns, checkpoint_id)
+        sends = [
+            (value_type, value)
+            for _, channel, value_type, value in self.load_writes(thread_id, checkpoint_ns, parent_checkpoint_id)
+            if channel == TASKS
+        ] if parent_checkpoint_id else []
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed((checkpoint_type, checkpoint)),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id
+                }
+            } if parent_checkpoint_id else None,
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = ("SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                 "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        with self.lock:
+            row = self.connect().execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+            return self.to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints WHERE 1 = 1")
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_checkpoint_id)
+        with self.lock:
+            rows = self.connect().execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+            checkpoints = [self.to_tuple(row[0], row[1], row[2:]) for row in rows]
+        for checkpoint in checkpoints:
+            if filter and not all(checkpoint.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None and limit <= 0:
+                break
+            if limit is not None:
+                limit -= 1
+            yield checkpoint
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        checkpoint = checkpoint.copy()
+        checkpoint.pop("pending_sends")
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    *self.serde.dumps_typed(checkpoint), *self.serde.dumps_typed(metadata),
+                ),
+            )
+            old_checkpoints = connection.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, CHECKPOINTS_KEPT_PER_THREAD),
+            ).fetchall()
+            for table in ("checkpoints", "writes"):
+                connection.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id, in old_checkpoints],
+                )
+            connection.commit()
+        return {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}
+        }
+
+    def put_writes(self, config, writes, task_id):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self.lock:
+            connection = self.connect()
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # special writes (as errors) are saved once, regular ones are replaced
+                statement = "INSERT OR IGNORE" if idx < 0 else "INSERT OR REPLACE"
+                connection.execute(
+                    f"{statement} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, *self.serde.dumps_typed(value)),
+                )
+            connection.commit()
+
+    @staticmethod
+    def prefix_pattern(thread_id_prefix):
+        return thread_id_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    def has_threads(self, thread_id_prefix):
+        with self.lock:
+            row = self.connect().execute(
+                "SELECT 1 FROM checkpoints WHERE thread_id LIKE ? ESCAPE '\\' LIMIT 1",
+                (self.prefix_pattern(thread_id_prefix),),
+            ).fetchone()
+        return row is not None
+
+    def delete_threads(self, thread_id_prefix):
+        with self.lock:
+            connection = self.connect()
+            for table in ("checkpoints", "writes"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE thread_id LIKE ? ESCAPE '\\'", (self.prefix_pattern(thread_id_prefix),)
+                )
+            connection.commit()
+
+
+_checkpointers = {}
+
+
+def get_checkpointer():
+    """Returns checkpointer of project, or None if checkpoints are turned off. Database is opened on first use."""
+    if os.getenv("AGENT_CHECKPOINTS") == "off":
+        return None
+    path = join_paths(os.getenv("WORK_DIR"), ".clean_coder/checkpoints.sqlite")
+    if path not in _checkpointers:
+        _checkpointers[path] = SqliteCheckpointSaver(path)
+    return _checkpointers[path]
+
+
+def task_key(task):
+    return hashlib.sha256(task.encode("utf-8")).hexdigest()[:16]
+
+
+def thread_config(task, agent_name):
+    # fresh configurable, as agents called from inside node of other graph would inherit checkpoint namespace of it
+    return {"configurable": {"thread_id": f"{task_key(task)}:{agent_name}", "checkpoint_ns": ""}}
+
+
+# keys of tasks which saved progress user decided to resume in this process
+_resumed_tasks = set()
+
+
+def resume_task(task):
+    """Allows agents to resume progress of task saved before, instead of discarding it."""
+    _resumed_tasks.add(task_key(task))
+
+
+def saved_state(graph, task, agent_name):
+    """Returns state saved when agent worked on task before, or empty dict if task is not resumed."""
+    if not graph.checkpointer or task_key(task) not in _resumed_tasks:
+        return {}
+    return graph.get_state(thread_config(task, agent_name)).values or {}
+
+
+def run_graph(graph, inputs, task, agent_name, recursion_limit, keep_finished=True):
+    """
+    Runs graph in thread of task and agent. If user decided to resume task (see prompt_resume_task), resumes thread
+    interrupted before, and if agent already finished that task, returns its final state without running it again.
+    Otherwise, progress saved before is discarded. With keep_finished=False checkpoints are removed once graph
+    finished - for agents called inside other agent's node, which will be run again on resume anyway.
+    """
+    checkpointer = graph.checkpointer
+    if not checkpointer:
+        return graph.invoke(inputs, {"recursion_limit": recursion_limit})
+    config = {**thread_config(task, agent_name), "recursion_limit": recursion_limit}
+    saved = graph.get_state(config)
+    if saved.values and task_key(task) not in _resumed_tasks:
+        checkpointer.delete_threads(config["configurable"]["thread_id"])
+        state = graph.invoke(inputs, config)
+    elif saved.values and saved.next:
+        print_formatted(f"Resuming {agent_name} from its last completed step.", color="yellow")
+        state = graph.invoke(None, config)
+    elif saved.values:
+        print_formatted(f"{agent_name} already finished that task, reusing its result.", color="yellow")
+        state = saved.values
+    else:
+        state = graph.invoke(inputs, config)
+    if not keep_finished:
+        checkpointer.delete_threads(config["configurable"]["thread_id"])
+    return state
+
+
+def prompt_resume_task(task):
+    """
+    Asks user if saved progress of task interrupted before should be resumed. Project files could change since then,
+    so results of agents which finished are reused only if user agrees; otherwise task starts from scratch.
+    """
+    checkpointer = get_checkpointer()
+    if not checkpointer or not checkpointer.has_threads(f"{task_key(task)}:"):
+        return
+    import questionary
+    from src.utilities.manager_utils import QUESTIONARY_STYLE
+    answer = questionary.select(
+        "Previous run of that task has been interrupted. Do you want to resume it?",
+        choices=["Resume", "Start from scratch"],
+        style=QUESTIONARY_STYLE,
+        instruction="\nHint: Results of agents which finished will be reused. Start from scratch if project files "
+                    "changed since then."
+    ).ask()
+    if answer == "Resume":
+        resume_task(task)
+    else:
+        clear_task_checkpoints(task)
+
+
+def prompt_keep_task_checkpoints(task):
+    """Asks user aborting task if its progress should be kept to be resumed later."""
+    checkpointer = get_checkpointer()
+    if not checkpointer or not checkpointer.has_threads(f"{task_key(task)}:"):
+        return
+    import questionary
+    from src.utilities.manager_utils import QUESTIONARY_STYLE
+    answer = questionary.select(
+        "Task aborted. Do you want to keep its progress to resume it later?",
+        choices=["Keep", "Discard"],
+        style=QUESTIONARY_STYLE,
+    ).ask()
+    if answer == "Discard":
+        clear_task_checkpoints(task)
+
+
+def clear_task_checkpoints(task):
+    """Called when whole pipeline of task finished or was aborted, so the same task run later starts from scratch."""
+    _resumed_tasks.discard(task_key(task))
+    checkpointer = get_checkpointer()
+    if checkpointer:
+        checkpointer.delete_threads(f"{task_key(task)}:")
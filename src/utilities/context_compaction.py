@@ -0,0 +1,174 @@
+"""
+Token-aware compaction of agent conversations. Size of every message is measured with local tokenizer; when
+conversation grows above token budget (CONTEXT_TOKEN_BUDGET), oldest messages are removed until it fits well below
+budget, and removed part is summarized by mini LLM into rolling summary message, which replaces summary of parts
+removed earlier. Initial messages of conversation (system prompt, task) and messages agent's logic depends on (file
+contents, tasks list) are never removed. AI message with tool calls is removed only together with its tool results,
+so providers never see tool call without result or result without call.
+"""
+import os
+import json
+from langchain_core.messages import HumanMessage
+from src.utilities.llms import init_llms_mini, llm_with_fallbacks
+from src.utilities.lazy import LazyObject
+from src.utilities.util_functions import load_prompt
+from src.utilities.print_formatters import print_formatted
+
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 60000
+# after compaction conversation takes that part of budget, so it's not compacted again on every turn
+COMPACTION_TARGET_RATIO = 0.6
+# newest units of conversation (AI message with its tool results, or human message) are always kept
+MIN_KEPT_UNITS = 2
+IMAGE_TOKENS = 1600
+# per message overhead of role and formatting
+MESSAGE_TOKENS = 4
+# each removed message is shown to summarizer up to that length
+MAX_SUMMARIZED_MESSAGE_CHARS = 3000
+PINNED_ATTRIBUTES = ("contains_file_contents", "contains_file_changes", "tasks_and_progress_message", "contains_screenshots")
+SUMMARY_HEADER = "Summary of earlier part of our conversation, removed to save space:\n\n"
+
+summarizer = LazyObject(lambda: llm_with_fallbacks(init_llms_mini(run_name="Context Summarizer")))
+_tokenizer = []
+
+
+def get_tokenizer():
+    """Returns tiktoken encoding, or None if it's not available (its vocabulary is downloaded on first use)."""
+    if not _tokenizer:
+        try:
+            import tiktoken
+            _tokenizer.append(tiktoken.get_encoding("cl100k_base"))
+        except Exception:
+            _tokenizer.append(None)
+    return _tokenizer[0]
+
+
+def count_text_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 4 + 1
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message):
+    tokens = MESSAGE_TOKENS
+    contents = [message.content] if isinstance(message.content, str) else message.content
+    for block in contents:
+        if isinstance(block, str):
+            tokens += count_text_tokens(block)
+        elif block.get("type") == "text":
+            tokens += count_text_tokens(block.get("text", ""))
+        else:
+            tokens += IMAGE_TOKENS
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += count_text_tokens(tool_call["name"] + json.dumps(tool_call["args"]))
+    return tokens
+
+
+def is_summary(message):
+    return hasattr(message, "context_summary")
+
+
+def message_text(message):
+    if isinstance(message.content, str):
+        text = message.content
+    else:
+        text = "\n".join(
+            block if isinstance(block, str) else block.get("text", "[image]") for block in message.content
+        )
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        text += f"\nCalled tool {tool_call['name']} with: {json.dumps(tool_call['args'])}"
+    if len(text) > MAX_SUMMARIZED_MESSAGE_CHARS:
+        text = text[:MAX_SUMMARIZED_MESSAGE_CHARS] + "\n[...]"
+    return f"{message.type}: {text}"
+
+
+class ContextCompactor:
+    def __init__(self, token_budget=None):
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET") or DEFAULT_CONTEXT_TOKEN_BUDGET)
+        # id of message -> (message, tokens); message is kept in entry, so its id is not reused by other object
+        self.token_counts = {}
+        self.warned_about_pinned = False
+
+    def tokens(self, message):
+        if id(message) not in self.token_counts:
+            self.token_counts[id(message)] = (message, count_message_tokens(message))
+        return self.token_counts[id(message)][1]
+
+    def units(self, messages):
+        """
+        Splits removable messages into units removed together: AI message with tool results following it, or human
+        message. Head of conversation (messages before first AI message or summary) and pinned messages are skipped.
+        Returns list of units, each being list of message indexes.
+        """
+        head_end = next((i for i, msg in enumerate(messages) if msg.type == "ai" or is_summary(msg)), len(messages))
+        units = []
+        for i in range(head_end, len(messages)):
+            message = messages[i]
+            if is_summary(message) or any(hasattr(message, attribute) for attribute in PINNED_ATTRIBUTES):
+                continue
+            if message.type == "tool" and units:
+                units[-1].append(i)
+            else:
+                units.append([i])
+        return units
+
+    def compact(self, messages):
+        """Returns messages fitting in token budget; if they already fit, returns them unchanged."""
+        messages = list(messages)
+        total = sum(self.tokens(message) for message in messages)
+        self.token_counts = {id(message): self.token_counts[id(message)] for message in messages}
+        if total <= self.token_budget:
+            return messages
+        units = self.units(messages)
+        removable_units = units[:-MIN_KEPT_UNITS]
+        removable_tokens = sum(self.tokens(messages[i]) for unit in removable_units for i in unit)
+        summaries_tokens = sum(self.tokens(message) for message in messages if is_summary(message))
+        # messages which can't be removed (pinned, head, newest ones) exceed budget alone - summarizing would not help,
+        # but would be repeated on every turn
+        if total - removable_tokens - summaries_tokens >= self.token_budget:
+            if not self.warned_about_pinned:
+                print_formatted(
+                    "Pinned messages (file contents, tasks, screenshots) alone exceed context token budget, "
+                    "context is not compacted. Consider increasing CONTEXT_TOKEN_BUDGET.",
+                    color="yellow",
+                )
+                self.warned_about_pinned = True
+            return messages
+        removed = set()
+        target = self.token_budget * COMPACTION_TARGET_RATIO
+        for unit in removable_units:
+            if total <= target:
+                break
+            removed.update(unit)
+            total -= sum(self.tokens(messages[i]) for i in unit)
+        if not removed:
+            return messages
+        print_formatted(f"Context too long, summarizing {len(removed)} oldest messages...", color="dark_grey")
+        previous_summaries = [msg for msg in messages if is_summary(msg)]
+        summary_message = self.summarize(
+            previous_summaries[-1].content[len(SUMMARY_HEADER):] if previous_summaries else "",
+            [messages[i] for i in sorted(removed)],
+        )
+        compacted = []
+        first_removed = min(removed)
+        for i, message in enumerate(messages):
+            if i == first_removed:
+                compacted.append(summary_message)
+            if i not in removed and not is_summary(message):
+                compacted.append(message)
+        return compacted
+
+    def summarize(self, previous_summary, removed_messages):
+        prompt = load_prompt("context_summarizer").format(
+            previous_summary=previous_summary or "(none)",
+            messages="\n\n".join(message_text(message) for message in removed_messages),
+        )
+        try:
+            summary = summarizer.invoke([HumanMessage(content=prompt)]).content
+            if not isinstance(summary, str):
+                summary = "".join(block if isinstance(block, str) else block.get("text", "") for block in summary)
+        except Exception as e:
+            print_formatted(f"Summarizing context failed: {e}", color="yellow")
+            summary = previous_summary + f"\n({len(removed_messages)} older messages removed without summary.)"
+        return HumanMessage(content=SUMMARY_HEADER + summary, context_summary=True)
@@ -0,0 +1,69 @@
+"""
+In-memory cache of project files shown to agents. Content is stored with modification time and size of file, and
+is read again only when any of them changed. Renderings of file (as with line numbers) are cached along with it.
+Edit tools invalidate file they wrote, so next view never shows stale content, even if write didn't change
+modification time or size.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+MAX_CACHED_FILES = 256
+
+
+class CachedFile:
+    def __init__(self, mtime_ns, size, lines):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.lines = lines
+        # name of rendering -> rendered content
+        self.renderings = {}
+
+
+class FileCache:
+    # absolute path -> CachedFile, least recently used first
+    files = OrderedDict()
+    lock = threading.Lock()
+
+    @staticmethod
+    def get(path):
+        """Returns cached file, reading it again if it changed on disk. Raises FileNotFoundError as open does."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with FileCache.lock:
+            cached = FileCache.files.get(path)
+            if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+                FileCache.files.move_to_end(path)
+                return cached
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+        cached = CachedFile(stat.st_mtime_ns, stat.st_size, lines)
+        FileCache.store(path, cached)
+        return cached
+
+    @staticmethod
+    def read_lines(path):
+        return FileCache.get(path).lines
+
+    @staticmethod
+    def render(path, rendering_name, render_lines):
+        """Returns file rendered by render_lines function, rendering it only once for each version of file."""
+        cached = FileCache.get(path)
+        if rendering_name not in cached.renderings:
+            cached.renderings[rendering_name] = render_lines(cached.lines)
+        return cached.renderings[rendering_name]
+
+    @staticmethod
+    def store(path, cached):
+        with FileCache.lock:
+            FileCache.files[path] = cached
+            FileCache.files.move_to_end(path)
+            while len(FileCache.files) > MAX_CACHED_FILES:
+                FileCache.files.popitem(last=False)
+
+    @staticmethod
+    def invalidate(path):
+        """Called by tools after they wrote to file."""
+        with FileCache.lock:
+            FileCache.files.pop(os.path.abspath(path), None)
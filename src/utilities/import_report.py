@@ -0,0 +1,94 @@
+"""
+Report of module import times, shown when Clean Coder is started with --import-time flag. Modules taking longest to
+import are printed right before first question to user, with total time spent on imports.
+"""
+import sys
+import time
+import threading
+from importlib.abc import MetaPathFinder
+
+
+MODULES_IN_REPORT = 20
+
+
+class TimedLoader:
+    def __init__(self, loader, name):
+        self.loader = loader
+        self.name = name
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        ImportTimer.started(self.name)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            ImportTimer.finished(self.name)
+
+
+class ImportTimer(MetaPathFinder):
+    # module name -> [cumulative time, self time]
+    times = {}
+    # stack of [module name, start time, time of nested imports] for every thread
+    local = threading.local()
+    start_time = None
+    reported = False
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = TimedLoader(spec.loader, fullname)
+            return spec
+        return None
+
+    @staticmethod
+    def stack():
+        if not hasattr(ImportTimer.local, "stack"):
+            ImportTimer.local.stack = []
+        return ImportTimer.local.stack
+
+    @staticmethod
+    def started(name):
+        ImportTimer.stack().append([name, time.perf_counter(), 0])
+
+    @staticmethod
+    def finished(name):
+        stack = ImportTimer.stack()
+        _, start, nested = stack.pop()
+        elapsed = time.perf_counter() - start
+        ImportTimer.times[name] = [elapsed, elapsed - nested]
+        if stack:
+            stack[-1][2] += elapsed
+
+
+def install():
+    """Starts timing imports if --import-time flag is provided. Called before any heavy import."""
+    if "--import-time" not in sys.argv or ImportTimer.start_time is not None:
+        return
+    sys.argv.remove("--import-time")
+    ImportTimer.start_time = time.perf_counter()
+    sys.meta_path.insert(0, ImportTimer())
+
+
+def report():
+    """Prints slowest imports once, if timing was started."""
+    if ImportTimer.start_time is None or ImportTimer.reported:
+        return
+    ImportTimer.reported = True
+    from src.utilities.print_formatters import print_formatted
+    print_formatted(
+        f"Startup took {time.perf_counter() - ImportTimer.start_time:.2f}s. Slowest imports (cumulative / self):",
+        color="dark_grey"
+    )
+    slowest = sorted(ImportTimer.times.items(), key=lambda item: item[1][0], reverse=True)[:MODULES_IN_REPORT]
+    for name, (cumulative, self_time) in slowest:
+        print_formatted(f"{cumulative:7.3f}s {self_time:7.3f}s  {name}", color="dark_grey")
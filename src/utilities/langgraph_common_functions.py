@@ -1,11 +1,17 @@
 from langchain_core.messages import HumanMessage
-from src.utilities.print_formatters import print_formatted, print_error, print_formatted_content, print_formatted_content
+from src.utilities.print_formatters import print_formatted, print_error, print_formatted_content, print_tool_message
 from src.utilities.util_functions import invoke_tool_native, TOOL_NOT_EXECUTED_WORD
 from src.utilities.user_input import user_input
 from langgraph.graph import END
 from src.utilities.graphics import LoadingAnimation
+from src.utilities.llm_router import LLMRouter
+from src.utilities.prompt_caching import with_cache_control, PromptCacheStats
+from langchain_core.messages import message_chunk_to_message
+from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
 import sys
+import os
 
 
 multiple_tools_msg = TOOL_NOT_EXECUTED_WORD + """You made multiple tool calls at once. If you want to execute 
@@ -14,48 +20,202 @@ no_tools_msg = TOOL_NOT_EXECUTED_WORD + """Please provide a tool call to execute
 empty_message_msg = TOOL_NOT_EXECUTED_WORD + "Empty messages are not allowed."
 finish_too_early_msg = TOOL_NOT_EXECUTED_WORD + """You want to call final response with other tool calls. Don't you finishing too early?"""
 
+# tools which only read project, safe to run before LLM finished its response
+READ_ONLY_TOOLS = {"see_file", "list_dir", "retrieve_files_by_semantic_query", "retrieve_files_by_semantic_queries"}
 
 animation = LoadingAnimation()
+tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool_call")
 
 # nodes
 def _get_llm_response(llms, messages, printing):
-    for llm in llms:
-        try:
-            return llm.invoke(messages)
-        except Exception as e:
-            if printing:
-                print_formatted(
-                    f"\nException happened: {e} with llm: {llm.bound.__class__.__name__}. "
-                    "Switching to next LLM if available...",
-                    color="yellow"
-                )
+    response = LLMRouter.invoke(llms, messages, printing)
+    if response is not None:
+        return response
     if printing:
         print_formatted("Can not receive response from any llm", color="red")
     sys.exit()
 
 
-def call_model(state, llms, printing=True):
+def call_model(state, llms, printing=True, tools=None):
+    """
+    Calls LLM and appends its response to messages. With LLM_STREAMING=on, response is printed as it arrives and
+    read-only tools from provided ones are executed as soon as their call is complete.
+    """
     messages = state["messages"]
+    # tools started for previous response which call_tool did not consume
+    EarlyToolCalls.discard_pending()
 
     if printing:
         animation.start()
-    response = _get_llm_response(llms, messages, printing)
-    if printing:
-        animation.stop()
+    if printing and os.getenv("LLM_STREAMING") == "on":
+        response = _stream_llm_response(llms, messages, tools)
+    else:
+        response = _get_llm_response(llms, messages, printing)
+        if printing:
+            animation.stop()
+            print_formatted_content(response)
 
-    if printing:
-        print_formatted_content(response)
     state["messages"].append(response)
 
     return state
 
+
+def _stream_llm_response(llms, messages, tools):
+    for llm in LLMRouter.ordered(llms):
+        health = LLMRouter.provider_health(llm)
+        start = time.monotonic()
+        response = None
+        early_calls = EarlyToolCalls(tools)
+        try:
+            for chunk in llm.stream(with_cache_control(llm, messages)):
+                if response is None:
+                    animation.stop()
+                response = chunk if response is None else response + chunk
+                text = chunk_text(chunk)
+                if text:
+                    print_formatted(content=text, color="dark_grey", end="")
+                    sys.stdout.flush()
+                # all tool calls except last one being streamed have complete arguments
+                if tools:
+                    for tool_call in response.tool_calls[:-1]:
+                        early_calls.start(tool_call)
+        except Exception as e:
+            animation.stop()
+            early_calls.cancel()
+            health.record_failure()
+            print_formatted(
+                f"\nException happened: {e} with llm: {llm.bound.__class__.__name__}. "
+                "Switching to next LLM if available...",
+                color="yellow"
+            )
+            continue
+        health.record_success(time.monotonic() - start)
+        response = message_chunk_to_message(response)
+        PromptCacheStats.record(llm, response)
+        early_calls.keep_only(response.tool_calls)
+        EarlyToolCalls.set_pending(early_calls)
+        print()
+        for tool_call in response.tool_calls:
+            print_tool_message(tool_name=tool_call["name"], tool_input=tool_call["args"])
+        return response
+    animation.stop()
+    print_formatted("Can not receive response from any llm", color="red")
+    sys.exit()
+
+
+def chunk_text(chunk):
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if block.get("type") in ("text", "text_delta"))
+
+
+class EarlyToolCalls:
+    """
+    Read-only tools started while one LLM response is still streamed, before call_tool asks for their results.
+    Calls of streamed response are pending for call_tool of the same thread, until it consumes them or next
+    call_model discards them.
+    """
+    pending = threading.local()
+
+    def __init__(self, tools):
+        self.tools = tools
+        # tool call id -> (tool call args, future of tool message)
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def start(self, tool_call):
+        if tool_call["name"] not in READ_ONLY_TOOLS or not tool_call.get("id"):
+            return
+        with self.lock:
+            if tool_call["id"] in self.started:
+                return
+            future = tool_executor.submit(invoke_tool_native, tool_call, self.tools)
+            self.started[tool_call["id"]] = (tool_call["args"], future)
+
+    def pop_result(self, tool_call):
+        """Returns tool message of tool already started with same arguments, or None."""
+        with self.lock:
+            started = self.started.pop(tool_call["id"], None)
+        if started is None:
+            return None
+        if started[0] != tool_call["args"]:
+            started[1].cancel()
+            return None
+        return started[1].result()
+
+    def keep_only(self, tool_calls):
+        """Cancels started tools which final response does not call with the same arguments."""
+        final_args = {tool_call["id"]: tool_call["args"] for tool_call in tool_calls}
+        with self.lock:
+            for tool_call_id, (args, future) in list(self.started.items()):
+                if final_args.get(tool_call_id) != args:
+                    future.cancel()
+                    del self.started[tool_call_id]
+
+    def cancel(self):
+        """Cancels tools not started yet; results of running ones are dropped."""
+        with self.lock:
+            for _, future in self.started.values():
+                future.cancel()
+            self.started.clear()
+
+    @staticmethod
+    def set_pending(early_calls):
+        EarlyToolCalls.discard_pending()
+        EarlyToolCalls.pending.calls = early_calls
+
+    @staticmethod
+    def take_pending():
+        early_calls = getattr(EarlyToolCalls.pending, "calls", None)
+        EarlyToolCalls.pending.calls = None
+        return early_calls
+
+    @staticmethod
+    def discard_pending():
+        early_calls = EarlyToolCalls.take_pending()
+        if early_calls is not None:
+            early_calls.cancel()
+
+
 def call_tool(state, tools):
+    """
+    Executes tool calls of last message. Consecutive read-only tool calls run concurrently; other tools run one by
+    one in order they were called. Tool messages are appended in order of calls.
+    """
     last_message = state["messages"][-1]
-    tool_response_messages = [invoke_tool_native(tool_call, tools) for tool_call in last_message.tool_calls]
+    early_calls = EarlyToolCalls.take_pending()
+    tool_response_messages = []
+    read_only_batch = []
+    try:
+        for tool_call in last_message.tool_calls:
+            if tool_call["name"] in READ_ONLY_TOOLS:
+                read_only_batch.append(tool_call)
+                continue
+            tool_response_messages.extend(invoke_read_only_tools(read_only_batch, tools, early_calls))
+            read_only_batch = []
+            tool_response_messages.append(invoke_tool_call(tool_call, tools, early_calls))
+        tool_response_messages.extend(invoke_read_only_tools(read_only_batch, tools, early_calls))
+    finally:
+        # calls removed from last message by agent are not consumed
+        if early_calls is not None:
+            early_calls.cancel()
     state["messages"].extend(tool_response_messages)
     return state
 
 
+def invoke_read_only_tools(tool_calls, tools, early_calls=None):
+    if len(tool_calls) < 2:
+        return [invoke_tool_call(tool_call, tools, early_calls) for tool_call in tool_calls]
+    futures = [tool_executor.submit(invoke_tool_call, tool_call, tools, early_calls) for tool_call in tool_calls]
+    return [future.result() for future in futures]
+
+
+def invoke_tool_call(tool_call, tools, early_calls=None):
+    # tool could be already started during streaming of LLM response
+    early_result = early_calls.pop_result(tool_call) if early_calls is not None else None
+    return early_result or invoke_tool_native(tool_call, tools)
+
+
 def ask_human(state):
     human_message = user_input("Type (o)k to accept or provide commentary. ")
     if human_message in ['o', 'ok']:
@@ -0,0 +1,23 @@
+"""
+Deferred initialization of module-level clients (LLMs, Todoist API, voice recorder), so importing modules that use
+them doesn't create clients, or import their heavy libraries, before they are really needed.
+"""
+import threading
+
+
+class LazyObject:
+    """Proxy creating object with provided function on first attribute access."""
+    def __init__(self, create):
+        self._create = create
+        self._object = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._create()
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,149 @@
+"""
+Routing of agent requests across fallback LLMs. Latency and failures of every provider are tracked. With
+LLM_HEDGING=on, request not answered within deadline based on provider's 95th percentile latency is sent again to the
+same model (hedged), and first response wins; slower request can't be cancelled, so both are paid. Hedging starts only
+after enough latencies of provider are known. Provider failing several times in a row is skipped for a while (circuit
+breaker), so broken provider doesn't stall agents.
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.utilities.print_formatters import print_formatted
+from src.utilities.prompt_caching import with_cache_control, PromptCacheStats
+
+
+LATENCY_WINDOW = 50
+# latencies needed before requests are hedged
+MIN_LATENCY_SAMPLES = 5
+MIN_HEDGE_DEADLINE = 5
+HEDGE_DEADLINE_FACTOR = 1.2
+FAILURES_TO_OPEN_CIRCUIT = 3
+CIRCUIT_OPEN_SECONDS = 60
+
+
+def provider_key(llm):
+    bound = getattr(llm, "bound", llm)
+    model = getattr(bound, "model", None) or getattr(bound, "model_name", None)
+    api_base = getattr(bound, "openai_api_base", None)
+    return f"{bound.__class__.__name__}:{model}" + (f"({api_base})" if api_base else "")
+
+
+class ProviderHealth:
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.open_until = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURES_TO_OPEN_CIRCUIT:
+                self.open_until = time.monotonic() + CIRCUIT_OPEN_SECONDS
+
+    def circuit_open(self):
+        # after open period single request is let through; its failure opens circuit again
+        return time.monotonic() < self.open_until
+
+    def hedge_deadline(self):
+        """Seconds after which request is hedged, or None if latency of provider is not known yet."""
+        with self.lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            latencies = sorted(self.latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        return max(MIN_HEDGE_DEADLINE, p95 * HEDGE_DEADLINE_FACTOR)
+
+
+class LLMRouter:
+    # provider key -> ProviderHealth
+    health = {}
+    lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm_router")
+
+    @staticmethod
+    def provider_health(llm):
+        key = provider_key(llm)
+        with LLMRouter.lock:
+            if key not in LLMRouter.health:
+                LLMRouter.health[key] = ProviderHealth()
+            return LLMRouter.health[key]
+
+    @staticmethod
+    def ordered(llms):
+        """LLMs in preference order, ones with open circuit moved to the end as last resort."""
+        return sorted(llms, key=lambda llm: LLMRouter.provider_health(llm).circuit_open())
+
+    @staticmethod
+    def timed_invoke(llm, messages):
+        health = LLMRouter.provider_health(llm)
+        start = time.monotonic()
+        try:
+            response = llm.invoke(with_cache_control(llm, messages))
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - start)
+        PromptCacheStats.record(llm, response)
+        return response
+
+    @staticmethod
+    def invoke(llms, messages, printing=True):
+        """Returns first successful response, or None if all LLMs failed."""
+        hedging = os.getenv("LLM_HEDGING") == "on"
+        candidates = LLMRouter.ordered(llms)
+        # future -> [llm, time after which request is hedged, or None if it's not hedged]
+        pending = {}
+
+        def submit(llm, hedged):
+            deadline = None if hedged or not hedging else LLMRouter.provider_health(llm).hedge_deadline()
+            pending[LLMRouter.executor.submit(LLMRouter.timed_invoke, llm, messages)] = [
+                llm, time.monotonic() + deadline if deadline is not None else None
+            ]
+
+        def start_next():
+            if not candidates:
+                return False
+            submit(candidates.pop(0), hedged=False)
+            return True
+
+        start_next()
+        while pending:
+            deadlines = [deadline for _, deadline in pending.values() if deadline is not None]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                slow_request = min(
+                    (request for request in pending.values() if request[1] is not None), key=lambda request: request[1]
+                )
+                slow_request[1] = None
+                if printing:
+                    print_formatted(
+                        f"\n{slow_request[0].bound.__class__.__name__} responds slowly, sending request again...",
+                        color="yellow"
+                    )
+                # the same model and run, so response doesn't depend on which request wins
+                submit(slow_request[0], hedged=True)
+                continue
+            for future in done:
+                llm, _ = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    if printing:
+                        print_formatted(
+                            f"\nException happened: {e} with llm: {llm.bound.__class__.__name__}. "
+                            "Switching to next LLM if available...",
+                            color="yellow"
+                        )
+                    if not pending:
+                        start_next()
+        return None
@@ -1,94 +1,257 @@
-from langchain_openai.chat_models import ChatOpenAI as ChatOpenRouter
-from langchain_openai.chat_models import ChatOpenAI as ChatLocalModel
 from os import getenv
 import os
+import time
+import sqlite3
+import hashlib
+import threading
 from dotenv import load_dotenv
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_ollama import ChatOllama
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+# provider libraries are imported in LLMRegistry.create, as they take long to import
 #from langchain_google_genai import ChatGoogleGenerativeAI
 
 load_dotenv()
 
+DEFAULT_RESPONSE_CACHE_MB = 100
 
-def llm_open_router(model):
-    return ChatOpenRouter(
-    openai_api_key=getenv("OPENROUTER_API_KEY"),
-    openai_api_base="https://openrouter.ai/api/v1",
-    model_name=model,
-    default_headers={
-        "HTTP-Referer": "https://github.com/Grigorij-Dudnik/Clean-Coder-AI",
-        "X-Title": "Clean Coder",
-    },
-    timeout=60,
-)
-
-def llm_open_local_hosted(model):
-    return ChatLocalModel(
-    openai_api_key="n/a",
-    openai_api_base=getenv("LOCAL_MODEL_API_BASE"),
-    model_name=model,
-    timeout=90,
-)
-
-def init_llms_medium_intelligence(tools=None, run_name="Clean Coder", temp=0):
+
+class LLMResponseCache(BaseCache):
+    """
+    Persistent cache of LLM responses in .clean_coder/llm_response_cache.sqlite, keyed by model with its parameters
+    (including bound tools) and serialized messages. Least recently used responses are evicted when cache grows
+    above LLM_RESPONSE_CACHE_MAX_MB.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = None
+        self.total_bytes = 0
+        # responses of describing engine are cached from many threads
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, size INTEGER, used_at REAL)"
+            )
+            self.connection.commit()
+            self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self.connection
+
+    @staticmethod
+    def key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.key(prompt, llm_string)
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+        return loads(row[0])
+
+    def update(self, prompt, llm_string, return_val):
+        response = dumps(return_val)
+        size = len(response)
+        with self.lock:
+            connection = self.connect()
+            old_row = connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (self.key(prompt, llm_string),)
+            ).fetchone()
+            self.total_bytes -= old_row[0] if old_row else 0
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (self.key(prompt, llm_string), response, size, time.time()),
+            )
+            self.total_bytes += size
+            self.evict()
+            connection.commit()
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes:
+            oldest = self.connection.execute(
+                "SELECT key, size FROM responses ORDER BY used_at LIMIT 100"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.connect().execute("DELETE FROM responses")
+            self.connection.commit()
+            self.total_bytes = 0
+
+
+_response_caches = {}
+
+
+def response_cache(run_name, temperature):
+    """
+    Returns response cache if it's enabled for run name in LLM_RESPONSE_CACHE env variable (comma separated run names),
+    otherwise None. Only deterministic calls (temperature 0) are cached.
+    """
+    enabled_run_names = {name.strip() for name in (getenv("LLM_RESPONSE_CACHE") or "").split(",") if name.strip()}
+    if temperature != 0 or run_name not in enabled_run_names:
+        return None
+    path = os.path.join(getenv("WORK_DIR"), ".clean_coder", "llm_response_cache.sqlite")
+    if path not in _response_caches:
+        max_bytes = float(getenv("LLM_RESPONSE_CACHE_MAX_MB") or DEFAULT_RESPONSE_CACHE_MB) * 1024 * 1024
+        _response_caches[path] = LLMResponseCache(path, max_bytes)
+    return _response_caches[path]
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of base chat models. Model with the same provider and parameters is created only once and
+    shared by all agents (agents bind their tools and run names to it, which is cheap), so its HTTP connections are
+    kept alive across agents and tasks. OpenAI compatible models share one pooled HTTP client as well.
+    """
+    # (provider, parameters) -> chat model
+    models = {}
+    http_client = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_http_client():
+        if LLMRegistry.http_client is None:
+            from openai import DefaultHttpxClient
+            LLMRegistry.http_client = DefaultHttpxClient()
+        return LLMRegistry.http_client
+
+    @staticmethod
+    def create(provider, params):
+        if provider == "anthropic":
+            from langchain_anthropic import ChatAnthropic
+            return ChatAnthropic(**params)
+        if provider == "openai":
+            from langchain_openai.chat_models import ChatOpenAI
+            return ChatOpenAI(http_client=LLMRegistry.get_http_client(), **params)
+        if provider == "ollama":
+            from langchain_ollama import ChatOllama
+            return ChatOllama(**params)
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    @staticmethod
+    def get(provider, shared=True, **params):
+        """
+        Returns chat model. Not shared models are created anew - needed by async code run in separate event loops,
+        as async HTTP clients can't be used from another event loop.
+        """
+        if not shared:
+            return LLMRegistry.create(provider, params)
+        key = (provider, repr(sorted(params.items())))
+        with LLMRegistry.lock:
+            if key not in LLMRegistry.models:
+                LLMRegistry.models[key] = LLMRegistry.create(provider, params)
+            return LLMRegistry.models[key]
+
+
+def llm_open_router(model, cache=None, shared=True):
+    return LLMRegistry.get(
+        "openai",
+        shared,
+        openai_api_key=getenv("OPENROUTER_API_KEY"),
+        openai_api_base="https://openrouter.ai/api/v1",
+        model_name=model,
+        default_headers={
+            "HTTP-Referer": "https://github.com/Grigorij-Dudnik/Clean-Coder-AI",
+            "X-Title": "Clean Coder",
+        },
+        timeout=60,
+        cache=cache,
+    )
+
+def llm_open_local_hosted(model, cache=None, shared=True):
+    return LLMRegistry.get(
+        "openai",
+        shared,
+        openai_api_key="n/a",
+        openai_api_base=getenv("LOCAL_MODEL_API_BASE"),
+        model_name=model,
+        timeout=90,
+        cache=cache,
+    )
+
+
+def agent_views(llms, tools, run_name):
+    """Binds tools and run name of agent to shared base models."""
+    for i, llm in enumerate(llms):
+        if tools:
+            llm = llm.bind_tools(tools)
+        llms[i] = llm.with_config({"run_name": run_name})
+    return llms
+
+
+def init_llms_medium_intelligence(tools=None, run_name="Clean Coder", temp=0, shared=True):
     llms = []
+    cache = response_cache(run_name, temp)
     if getenv("ANTHROPIC_API_KEY"):
-        llms.append(ChatAnthropic(model='claude-3-5-sonnet-latest', temperature=temp, timeout=60, max_tokens=4096))
+        llms.append(LLMRegistry.get(
+            "anthropic", shared, model='claude-3-5-sonnet-latest', temperature=temp, timeout=60, max_tokens=4096,
+            cache=cache
+        ))
     if getenv("OPENROUTER_API_KEY"):
-        llms.append(llm_open_router("anthropic/claude-3.5-sonnet"))
+        llms.append(llm_open_router("anthropic/claude-3.5-sonnet", cache, shared))
     if getenv("OPENAI_API_KEY"):
-        llms.append(ChatOpenAI(model="gpt-4o", temperature=temp, timeout=60))
+        llms.append(LLMRegistry.get("openai", shared, model="gpt-4o", temperature=temp, timeout=60, cache=cache))
 
     if getenv("OLLAMA_MODEL"):
-        llms.append(ChatOllama(model=os.getenv("OLLAMA_MODEL")))
+        llms.append(LLMRegistry.get("ollama", shared, model=os.getenv("OLLAMA_MODEL"), cache=cache))
     if getenv("LOCAL_MODEL_API_BASE"):
-        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME")))
-    for i, llm in enumerate(llms):
-        if tools:
-            llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
-    return llms
+        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME"), cache, shared))
+    return agent_views(llms, tools, run_name)
 
 
-def init_llms_mini(tools=None, run_name="Clean Coder", temp=0):
+def init_llms_mini(tools=None, run_name="Clean Coder", temp=0, shared=True):
     llms = []
+    cache = response_cache(run_name, temp)
     if os.getenv("ANTHROPIC_API_KEY"):
-        llms.append(ChatAnthropic(model='claude-3-5-haiku-20241022', temperature=temp, timeout=60))
+        llms.append(LLMRegistry.get(
+            "anthropic", shared, model='claude-3-5-haiku-20241022', temperature=temp, timeout=60, cache=cache
+        ))
     if os.getenv("OPENROUTER_API_KEY"):
-        llms.append(llm_open_router("anthropic/claude-3.5-haiku"))
+        llms.append(llm_open_router("anthropic/claude-3.5-haiku", cache, shared))
     if os.getenv("OPENAI_API_KEY"):
-        llms.append(ChatOpenAI(model="gpt-4o-mini", temperature=temp, timeout=60))
+        llms.append(LLMRegistry.get("openai", shared, model="gpt-4o-mini", temperature=temp, timeout=60, cache=cache))
     # if os.getenv("GOOGLE_API_KEY"):
     #     llms.append(ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=temp, timeout=60))
     if os.getenv("OLLAMA_MODEL"):
-        llms.append(ChatOllama(model=os.getenv("OLLAMA_MODEL")))
+        llms.append(LLMRegistry.get("ollama", shared, model=os.getenv("OLLAMA_MODEL"), cache=cache))
     if getenv("LOCAL_MODEL_API_BASE"):
-        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME")))
-    for i, llm in enumerate(llms):
-        if tools:
-            llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
-    return llms
+        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME"), cache, shared))
+    return agent_views(llms, tools, run_name)
 
 
-def init_llms_high_intelligence(tools=None, run_name="Clean Coder", temp=0.2):
+def init_llms_high_intelligence(tools=None, run_name="Clean Coder", temp=0.2, shared=True):
     llms = []
     if os.getenv("ANTHROPIC_API_KEY"):
-        llms.append(ChatAnthropic(model='claude-3-7-sonnet-latest', temperature=temp, timeout=60, max_tokens=4096))
+        llms.append(LLMRegistry.get(
+            "anthropic", shared, model='claude-3-7-sonnet-latest', temperature=temp, timeout=60, max_tokens=4096
+        ))
     if getenv("OPENROUTER_API_KEY"):
-        llms.append(llm_open_router("anthropic/claude-3.7-sonnet"))
+        llms.append(llm_open_router("anthropic/claude-3.7-sonnet", shared=shared))
     if os.getenv("OPENAI_API_KEY"):
-        llms.append(ChatOpenAI(model="o3-mini", temperature=1, timeout=60, reasoning_effort="high"))
+        llms.append(LLMRegistry.get(
+            "openai", shared, model="o3-mini", temperature=1, timeout=60, reasoning_effort="high"
+        ))
     if os.getenv("OPENAI_API_KEY"):
-        llms.append(ChatOpenAI(model="o1", temperature=1, timeout=60))
+        llms.append(LLMRegistry.get("openai", shared, model="o1", temperature=1, timeout=60))
 
     if os.getenv("OLLAMA_MODEL"):
-        llms.append(ChatOllama(model=os.getenv("OLLAMA_MODEL")))
+        llms.append(LLMRegistry.get("ollama", shared, model=os.getenv("OLLAMA_MODEL")))
     if getenv("LOCAL_MODEL_API_BASE"):
-        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME")))
-    for i, llm in enumerate(llms):
-        if tools:
-            llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
-    return llms
\ No newline at end of file
+        llms.append(llm_open_local_hosted(getenv("LOCAL_MODEL_NAME"), shared=shared))
+    return agent_views(llms, tools, run_name)
+
+
+def llm_with_fallbacks(llms):
+    return llms[0].with_fallbacks(llms[1:])
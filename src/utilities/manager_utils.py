@@ -2,13 +2,13 @@
 In manager_utils.py we are placing all functions used by manager agent only, which are not tools.
 """
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, AIMessage
-from src.utilities.llms import init_llms_medium_intelligence
-from src.utilities.util_functions import join_paths, read_coderrules, list_directory_tree, load_prompt
+from src.utilities.llms import init_llms_medium_intelligence, llm_with_fallbacks
+from src.utilities.lazy import LazyObject
+from src.utilities.util_functions import join_paths, read_coderrules, list_directory_tree, load_prompt, create_todoist_api
 from src.utilities.start_project_functions import create_project_plan_file
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.load import loads
-from todoist_api_python.api import TodoistAPI
 import questionary
 import concurrent.futures
 from dotenv import load_dotenv, find_dotenv
@@ -24,7 +24,7 @@ load_dotenv(find_dotenv())
 work_dir = os.getenv("WORK_DIR")
 load_dotenv(join_paths(work_dir, ".clean_coder/.env"))
 todoist_api_key = os.getenv('TODOIST_API_KEY')
-todoist_api = TodoistAPI(os.getenv('TODOIST_API_KEY'))
+todoist_api = LazyObject(create_todoist_api)
 
 QUESTIONARY_STYLE = questionary.Style([
     ('qmark', 'fg:magenta bold'),      # The '?' symbol
@@ -42,8 +42,7 @@ QUESTIONARY_STYLE = questionary.Style([
 actualize_progress_description_prompt_template = load_prompt("actualize_progress_description")
 tasks_progress_template = load_prompt("manager_progress")
 
-llms = init_llms_medium_intelligence(run_name="Progress description")
-llm = llms[0].with_fallbacks(llms[1:])
+llm = LazyObject(lambda: llm_with_fallbacks(init_llms_medium_intelligence(run_name="Progress description")))
 
 
 def read_project_plan():
@@ -124,7 +123,7 @@ def parse_project_tasks(tasks):
 def actualize_progress_description_file(task_name_description):
     progress_description = read_progress_description()
     actualize_description_prompt = PromptTemplate.from_template(actualize_progress_description_prompt_template)
-    chain = actualize_description_prompt | llm | StrOutputParser()
+    chain = actualize_description_prompt | llm.get() | StrOutputParser()
     progress_description = chain.invoke(
         {
             "progress_description": progress_description,
@@ -237,11 +236,15 @@ def prompt_user_if_planning_needed():
     return choice == "Start/continue planning my project (Default)"
 
 
-def get_manager_messages(saved_messages_path):
+def get_manager_messages(message_journal):
     tasks = fetch_tasks()
-    if os.path.exists(saved_messages_path):
+    # conversations saved before journal been introduced
+    legacy_messages_path = join_paths(work_dir, ".clean_coder/manager_messages.json")
+    if message_journal.exists():
         # continue previous work
-        with open(saved_messages_path, "r") as fp:
+        messages = message_journal.load()
+    elif os.path.exists(legacy_messages_path):
+        with open(legacy_messages_path, "r") as fp:
             messages = loads(json.load(fp))
     else:
         # new start
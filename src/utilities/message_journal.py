@@ -0,0 +1,95 @@
+"""
+Append-only journal of Manager's conversation in .clean_coder/manager_messages.jsonl. Each save appends one line
+describing the new message list as segments: ranges of previously saved list (messages are recognized by identity,
+as graph keeps the same message objects between turns) and serialized new messages. So cost of save is proportional
+to new messages only, not to whole conversation. When journal grows much bigger than the conversation it describes
+(old messages cut off), it is compacted into a single line.
+"""
+import os
+import json
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+# journal is compacted when it's that many times bigger than saved conversation
+COMPACTION_RATIO = 3
+MIN_COMPACTION_BYTES = 1024 * 1024
+
+
+class MessageJournal:
+    def __init__(self, path):
+        self.path = path
+        # last saved messages and sizes of their serialized forms
+        self.messages = []
+        self.sizes = []
+        self.journal_bytes = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns saved messages, or None if there is no journal."""
+        if not self.exists():
+            return None
+        messages, sizes = [], []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line could be written partially during crash
+                    continue
+                new_messages, new_sizes = [], []
+                for segment in record["segments"]:
+                    if "old" in segment:
+                        start, end = segment["old"]
+                        new_messages += messages[start:end]
+                        new_sizes += sizes[start:end]
+                    else:
+                        new_messages += messages_from_dict(segment["new"])
+                        new_sizes += [len(json.dumps(message)) for message in segment["new"]]
+                messages, sizes = new_messages, new_sizes
+        self.messages, self.sizes = messages, sizes
+        self.journal_bytes = os.path.getsize(self.path)
+        return list(messages)
+
+    def segments(self, messages):
+        """Describes messages as ranges of previously saved list and new messages. Returns (segments, sizes)."""
+        old_indexes = {id(message): i for i, message in enumerate(self.messages)}
+        segments, sizes = [], []
+        for message in messages:
+            i = old_indexes.get(id(message))
+            if i is not None:
+                sizes.append(self.sizes[i])
+                if segments and "old" in segments[-1] and segments[-1]["old"][1] == i:
+                    segments[-1]["old"][1] = i + 1
+                else:
+                    segments.append({"old": [i, i + 1]})
+            else:
+                serialized = message_to_dict(message)
+                sizes.append(len(json.dumps(serialized)))
+                if segments and "new" in segments[-1]:
+                    segments[-1]["new"].append(serialized)
+                else:
+                    segments.append({"new": [serialized]})
+        return segments, sizes
+
+    def save(self, messages):
+        if [id(message) for message in messages] == [id(message) for message in self.messages]:
+            return
+        segments, sizes = self.segments(messages)
+        line = json.dumps({"segments": segments}) + "\n"
+        if self.journal_bytes + len(line.encode('utf-8')) > max(COMPACTION_RATIO * sum(sizes), MIN_COMPACTION_BYTES):
+            self.compact(messages, sizes)
+        else:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.journal_bytes += len(line.encode('utf-8'))
+        self.messages, self.sizes = list(messages), sizes
+
+    def compact(self, messages, sizes):
+        line = json.dumps({"segments": [{"new": [message_to_dict(message) for message in messages]}]}) + "\n"
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(line)
+        os.replace(temporary_path, self.path)
+        self.journal_bytes = len(line.encode('utf-8'))
@@ -0,0 +1,422 @@
+"""
+Snapshot of project directory tree, built once and kept current by watching file system, so tree shown to agents
+at start of their sessions is rendered without walking whole project again. Changes are watched with inotify
+on Linux; where it's not available (other systems, exhausted watch limit) directories are polled for modification
+time changes every PROJECT_TREE_POLL_INTERVAL seconds. Changed directories are rescanned lazily at next render.
+Tree is rendered within token budget, collapsing less important directories into summaries.
+"""
+import os
+import re
+import sys
+import time
+import heapq
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import Counter
+from src.utilities.start_work_functions import CoderIgnore, walk_not_ignored
+
+
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_CLOEXEC = 0o2000000
+# only adding, removing and renaming of entries changes tree; file content modifications are not watched
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+DEFAULT_POLL_INTERVAL = 2
+DEFAULT_TOKEN_BUDGET = 3000
+RELEVANCE_BONUS = 10
+RECENCY_BONUS = 3
+# directories with entries added, removed or renamed during that time count as recently modified
+RECENT_SECONDS = 24 * 3600
+# every that many files lower priority of listing folder's files by one level of depth
+LEAF_HEAVY_FILES = 20
+MAX_SUMMARY_EXTENSIONS = 5
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class InotifyWatcher:
+    """Marks directories as changed on inotify events. Raises OSError if inotify is not available."""
+    def __init__(self, on_change, on_overflow):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is available on Linux only")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        # watch descriptor -> relative path of watched directory
+        self.watched = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.read_events, daemon=True).start()
+
+    def watch(self, path, rel_dir):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        with self.lock:
+            self.watched[wd] = rel_dir
+
+    def read_events(self):
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except OSError:
+                return
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, name_length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size + name_length
+                if mask & IN_Q_OVERFLOW:
+                    self.on_overflow()
+                    continue
+                with self.lock:
+                    rel_dir = self.watched.pop(wd, None) if mask & IN_IGNORED else self.watched.get(wd)
+                if rel_dir is not None:
+                    self.on_change(rel_dir)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Marks directories as changed when their modification time changes."""
+    def __init__(self, work_dir, on_change, interval):
+        self.work_dir = work_dir
+        self.on_change = on_change
+        self.interval = interval
+        # relative path of directory -> its last seen modification time
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        threading.Thread(target=self.poll, daemon=True).start()
+
+    def watch(self, path, rel_dir):
+        with self.lock:
+            self.watched[rel_dir] = self.mtime(path)
+
+    @staticmethod
+    def mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                watched = list(self.watched.items())
+            for rel_dir, last_mtime in watched:
+                mtime = self.mtime(os.path.join(self.work_dir, rel_dir))
+                if mtime != last_mtime:
+                    with self.lock:
+                        if mtime is None:
+                            self.watched.pop(rel_dir, None)
+                        else:
+                            self.watched[rel_dir] = mtime
+                    self.on_change(rel_dir)
+
+    def close(self):
+        self.stopped.set()
+
+
+class TreeSnapshot:
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        # relative path of directory ('.' for root) -> (subdirectories, files), both filtered by .coderignore
+        self.entries = {}
+        # relative path of directory -> its modification time, changing when entries are added, removed or renamed
+        self.mtimes = {}
+        self.changed_dirs = set()
+        # (token budget, task) -> rendered tree
+        self.rendered = {}
+        self.coderignore_mtime = None
+        self.lock = threading.Lock()
+        self.watcher = None
+        self.start_watcher()
+        self.rebuild()
+
+    def start_watcher(self):
+        try:
+            self.watcher = InotifyWatcher(self.mark_changed, self.mark_all_changed)
+        except OSError:
+            interval = float(os.getenv("PROJECT_TREE_POLL_INTERVAL") or DEFAULT_POLL_INTERVAL)
+            self.watcher = PollingWatcher(self.work_dir, self.mark_changed, interval)
+
+    def switch_to_polling(self):
+        """Falls back to polling when inotify watch limit exhausted."""
+        self.watcher.close()
+        interval = float(os.getenv("PROJECT_TREE_POLL_INTERVAL") or DEFAULT_POLL_INTERVAL)
+        self.watcher = PollingWatcher(self.work_dir, self.mark_changed, interval)
+        for rel_dir in self.entries:
+            self.watcher.watch(os.path.join(self.work_dir, rel_dir), rel_dir)
+
+    def watch(self, rel_dir):
+        try:
+            self.watcher.watch(os.path.join(self.work_dir, rel_dir), rel_dir)
+        except OSError:
+            self.switch_to_polling()
+            self.watcher.watch(os.path.join(self.work_dir, rel_dir), rel_dir)
+
+    def mark_changed(self, rel_dir):
+        with self.lock:
+            self.changed_dirs.add(rel_dir)
+
+    def mark_all_changed(self):
+        with self.lock:
+            self.changed_dirs.update(self.entries)
+
+    def rebuild(self):
+        with self.lock:
+            self.entries = {}
+            self.mtimes = {}
+            self.changed_dirs = set()
+            self.scan_subtree(".")
+            self.coderignore_mtime = CoderIgnore.coderignore_mtime
+            self.rendered = {}
+
+    def scan_subtree(self, rel_dir):
+        top = self.work_dir if rel_dir == "." else os.path.join(self.work_dir, rel_dir)
+        for root, dirs, files in walk_not_ignored(top, self.work_dir):
+            root_rel_dir = os.path.relpath(root, self.work_dir)
+            self.entries[root_rel_dir] = (list(dirs), files)
+            self.mtimes[root_rel_dir] = os.path.getmtime(root)
+            self.watch(root_rel_dir)
+
+    def remove_subtree(self, rel_dir):
+        prefix = rel_dir + os.sep
+        for removed_dir in [d for d in self.entries if d == rel_dir or d.startswith(prefix)]:
+            del self.entries[removed_dir]
+            self.mtimes.pop(removed_dir, None)
+
+    def apply_changes(self):
+        """Rescans only directories changed since last render. Rebuilds all if .coderignore changed."""
+        CoderIgnore.refresh_if_changed()
+        if CoderIgnore.coderignore_mtime != self.coderignore_mtime:
+            self.rebuild()
+            return
+        with self.lock:
+            changed_dirs, self.changed_dirs = self.changed_dirs, set()
+            if not changed_dirs:
+                return
+            # parents first, so subtrees of removed directories are dropped before their own changes are applied
+            for rel_dir in sorted(changed_dirs, key=lambda d: d.count(os.sep)):
+                if rel_dir in self.entries:
+                    self.rescan_dir(rel_dir)
+            self.rendered = {}
+
+    def rescan_dir(self, rel_dir):
+        """Lists directory again; subtrees of its remaining subdirectories are kept current by their own watches."""
+        path = self.work_dir if rel_dir == "." else os.path.join(self.work_dir, rel_dir)
+        listing = next(walk_not_ignored(path, self.work_dir), None) if os.path.isdir(path) else None
+        if listing is None:
+            self.remove_subtree(rel_dir)
+            return
+        _, dirs, files = listing
+        old_dirs = self.entries[rel_dir][0]
+        self.entries[rel_dir] = (dirs, files)
+        self.mtimes[rel_dir] = os.path.getmtime(path)
+        for subdir in set(old_dirs) - set(dirs):
+            self.remove_subtree(subdir if rel_dir == "." else os.path.join(rel_dir, subdir))
+        for subdir in set(dirs) - set(old_dirs):
+            self.scan_subtree(subdir if rel_dir == "." else os.path.join(rel_dir, subdir))
+
+    def render(self, token_budget, task=None):
+        self.apply_changes()
+        with self.lock:
+            key = (token_budget, task)
+            if key not in self.rendered:
+                renderer = TreeRenderer(self.entries, self.mtimes, os.path.basename(self.work_dir), task)
+                self.rendered[key] = "Content of directory tree:\n" + renderer.render(token_budget)
+            return self.rendered[key]
+
+
+class TreeRenderer:
+    """
+    Renders tree fitting into token budget. Every directory starts collapsed into one line summary; directories
+    are then expanded by priority while budget allows: first their subfolders (with files summarized by extension),
+    then list of their files. Directories mentioned in task and recently modified ones are expanded first, shallow
+    ones before deep ones, and folders with many files get their files listed last.
+    """
+    def __init__(self, entries, mtimes, root_name, task=None):
+        self.entries = entries
+        self.mtimes = mtimes
+        self.root_name = root_name
+        self.relevant_dirs = self.find_relevant_dirs(task) if task else set()
+        self.subtree_counts = self.count_subtrees()
+        self.expanded = set()
+        self.listed = set()
+
+    def find_relevant_dirs(self, task):
+        """Directories which name, or name of their file, appears in task - together with their parents."""
+        terms = set(re.findall(r"[a-z0-9_\-.]{3,}", task.lower()))
+        terms.update(part for term in re.findall(r"[a-z0-9_\-./]{3,}", task.lower()) for part in term.split("/"))
+        relevant_dirs = set()
+        for rel_dir, (_, files) in self.entries.items():
+            names = [os.path.basename(rel_dir).lower()] + [
+                name for file in files for name in (file.lower(), os.path.splitext(file)[0].lower())
+            ]
+            if rel_dir != "." and any(name in terms for name in names):
+                while rel_dir not in relevant_dirs and rel_dir:
+                    relevant_dirs.add(rel_dir)
+                    rel_dir = os.path.dirname(rel_dir)
+        return relevant_dirs
+
+    def count_subtrees(self):
+        """Relative directory path -> (count of folders, count of files per extension) in whole its subtree."""
+        counts = {}
+        # children before parents
+        for rel_dir in sorted(self.entries, key=self.depth, reverse=True):
+            dirs, files = self.entries[rel_dir]
+            folders_count = 0
+            extensions = Counter(self.extension(file) for file in files)
+            for subdir in dirs:
+                sub_counts = counts.get(self.child(rel_dir, subdir))
+                if sub_counts:
+                    folders_count += 1 + sub_counts[0]
+                    extensions.update(sub_counts[1])
+            counts[rel_dir] = (folders_count, extensions)
+        return counts
+
+    @staticmethod
+    def extension(file):
+        return os.path.splitext(file)[1] or "no extension"
+
+    @staticmethod
+    def child(rel_dir, subdir):
+        return subdir if rel_dir == "." else os.path.join(rel_dir, subdir)
+
+    @staticmethod
+    def depth(rel_dir):
+        return 0 if rel_dir == "." else rel_dir.count(os.sep) + 1
+
+    def subdirs(self, rel_dir):
+        # symlinked directories are listed by walk, but not walked into
+        return [self.child(rel_dir, d) for d in self.entries[rel_dir][0] if self.child(rel_dir, d) in self.entries]
+
+    @staticmethod
+    def extensions_summary(extensions):
+        summary = ", ".join(f"{count} {extension}" for extension, count in extensions.most_common(MAX_SUMMARY_EXTENSIONS))
+        if len(extensions) > MAX_SUMMARY_EXTENSIONS:
+            summary += ", ..."
+        return summary
+
+    def header_line(self, rel_dir):
+        depth = self.depth(rel_dir)
+        name = self.root_name if rel_dir == "." else os.path.basename(rel_dir)
+        return f"{'│ ' * (depth - 1) if depth else ''}{'└──' if depth > 0 else ''}📁 {name}"
+
+    def collapsed_line(self, rel_dir):
+        folders_count, extensions = self.subtree_counts[rel_dir]
+        files_count = sum(extensions.values())
+        indent = "│ " * (self.depth(rel_dir))
+        if folders_count + files_count == 0:
+            return f"{indent}<Directory is empty>"
+        summary = f"{folders_count} folders, {files_count} files"
+        if files_count:
+            summary += f": {self.extensions_summary(extensions)}"
+        return f"{indent}<collapsed - {summary}>"
+
+    def files_summary_line(self, rel_dir):
+        files = self.entries[rel_dir][1]
+        extensions = Counter(self.extension(file) for file in files)
+        return f"{'│ ' * self.depth(rel_dir)}<{len(files)} files: {self.extensions_summary(extensions)}>"
+
+    def file_lines(self, rel_dir):
+        files = self.entries[rel_dir][1]
+        indent = "│ " * self.depth(rel_dir)
+        return [f"{indent}{'└── ' if i == len(files) - 1 else '├── '}{file}" for i, file in enumerate(files)]
+
+    def priority(self, rel_dir, listing_files=False):
+        score = -self.depth(rel_dir)
+        if rel_dir in self.relevant_dirs:
+            score += RELEVANCE_BONUS
+        if time.time() - self.mtimes.get(rel_dir, 0) < RECENT_SECONDS:
+            score += RECENCY_BONUS
+        if listing_files:
+            # listing long folder costs a lot and tells little more than summary of its extensions
+            score -= 1 + len(self.entries[rel_dir][1]) / LEAF_HEAVY_FILES
+        return score
+
+    def expansion_cost(self, rel_dir):
+        cost = -estimate_tokens(self.collapsed_line(rel_dir))
+        if self.entries[rel_dir][1]:
+            cost += estimate_tokens(self.files_summary_line(rel_dir))
+        for subdir in self.subdirs(rel_dir):
+            cost += estimate_tokens(self.header_line(subdir)) + estimate_tokens(self.collapsed_line(subdir))
+        return cost
+
+    def listing_cost(self, rel_dir):
+        return sum(estimate_tokens(line) for line in self.file_lines(rel_dir)) - \
+            estimate_tokens(self.files_summary_line(rel_dir))
+
+    def plan(self, token_budget):
+        """Greedily chooses directories to expand and to list files of, most important first."""
+        used = estimate_tokens(self.header_line(".")) + estimate_tokens(self.collapsed_line("."))
+        # (negated priority, order of adding, is files listing, relative directory path)
+        candidates = [(-self.priority("."), 0, False, ".")]
+        order = 1
+        while candidates:
+            _, _, listing_files, rel_dir = heapq.heappop(candidates)
+            if listing_files:
+                cost = self.listing_cost(rel_dir)
+                if used + cost <= token_budget:
+                    used += cost
+                    self.listed.add(rel_dir)
+                continue
+            if not self.subtree_counts[rel_dir][0] and not self.entries[rel_dir][1]:
+                continue
+            cost = self.expansion_cost(rel_dir)
+            if used + cost > token_budget:
+                continue
+            used += cost
+            self.expanded.add(rel_dir)
+            if self.entries[rel_dir][1]:
+                heapq.heappush(candidates, (-self.priority(rel_dir, listing_files=True), order, True, rel_dir))
+                order += 1
+            for subdir in self.subdirs(rel_dir):
+                heapq.heappush(candidates, (-self.priority(subdir), order, False, subdir))
+                order += 1
+
+    def render(self, token_budget):
+        self.plan(token_budget)
+        return "\n".join(self.render_dir("."))
+
+    def render_dir(self, rel_dir):
+        lines = [self.header_line(rel_dir)]
+        if rel_dir not in self.expanded:
+            lines.append(self.collapsed_line(rel_dir))
+            return lines
+        if rel_dir in self.listed:
+            lines.extend(self.file_lines(rel_dir))
+        elif self.entries[rel_dir][1]:
+            lines.append(self.files_summary_line(rel_dir))
+        for subdir in self.subdirs(rel_dir):
+            lines.extend(self.render_dir(subdir))
+        return lines
+
+
+_tree_snapshots = {}
+_tree_snapshots_lock = threading.Lock()
+
+
+def get_tree_snapshot(work_dir):
+    """Returns snapshot of work dir tree, built on first call and kept current afterwards."""
+    work_dir = os.path.normpath(work_dir)
+    with _tree_snapshots_lock:
+        if work_dir not in _tree_snapshots:
+            _tree_snapshots[work_dir] = TreeSnapshot(work_dir)
+        return _tree_snapshots[work_dir]
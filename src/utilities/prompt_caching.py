@@ -0,0 +1,106 @@
+"""
+Prompt caching of stable beginnings of agent conversations. Anthropic caches prompt prefix only up to messages marked
+with cache_control, so before sending, system prompt, file contents message and last human message are marked as
+cache breakpoints. OpenAI caches long prefixes automatically, without marking. For both, messages are never
+modified in place - prefix sent in next turn stays byte-identical.
+Cache hits and tokens read from cache are counted per agent and reported at exit.
+"""
+import atexit
+import threading
+from collections import defaultdict
+from src.utilities.print_formatters import print_formatted
+
+
+# Anthropic allows at most 4 cache breakpoints in request
+MAX_BREAKPOINTS = 4
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_cache_control(llm):
+    return getattr(llm, "bound", llm).__class__.__name__ == "ChatAnthropic"
+
+
+def has_content(message):
+    return bool(message.content) if isinstance(message.content, str) else any(message.content)
+
+
+def cache_breakpoints(messages):
+    """Indexes of messages ending stable prefixes: system prompt, file contents and last human message."""
+    candidates = [i for i, msg in enumerate(messages) if msg.type in ("system", "human") and has_content(msg)]
+    breakpoints = set()
+    system_indexes = [i for i in candidates if messages[i].type == "system"]
+    file_contents_indexes = [i for i in candidates if hasattr(messages[i], "contains_file_contents")]
+    if system_indexes:
+        breakpoints.add(system_indexes[0])
+    if file_contents_indexes:
+        breakpoints.add(file_contents_indexes[-1])
+    if candidates:
+        breakpoints.add(candidates[-1])
+    return sorted(breakpoints)[-MAX_BREAKPOINTS:]
+
+
+def mark_cache_breakpoint(message):
+    """Returns copy of message with cache control set on its last text block."""
+    if isinstance(message.content, str):
+        content = [{"type": "text", "text": message.content, "cache_control": CACHE_CONTROL}]
+    else:
+        content = [{"type": "text", "text": block} if isinstance(block, str) else dict(block) for block in message.content]
+        # cache control of image blocks is lost in conversion to Anthropic format
+        text_indexes = [i for i, block in enumerate(content) if block.get("type") == "text" and block.get("text")]
+        if not text_indexes:
+            return message
+        content[text_indexes[-1]]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": content})
+
+
+def with_cache_control(llm, messages):
+    if not supports_cache_control(llm):
+        return messages
+    messages = list(messages)
+    for i in cache_breakpoints(messages):
+        messages[i] = mark_cache_breakpoint(messages[i])
+    return messages
+
+
+def cache_usage(response):
+    """Returns (tokens read from cache, tokens written to cache) of LLM response, in any provider's format."""
+    details = (getattr(response, "usage_metadata", None) or {}).get("input_token_details") or {}
+    if details.get("cache_read") is not None:
+        return details.get("cache_read", 0), details.get("cache_creation", 0)
+    metadata = getattr(response, "response_metadata", None) or {}
+    # Anthropic
+    usage = metadata.get("usage") or {}
+    if "cache_read_input_tokens" in usage:
+        return usage.get("cache_read_input_tokens") or 0, usage.get("cache_creation_input_tokens") or 0
+    # OpenAI and OpenAI compatible APIs
+    prompt_details = (metadata.get("token_usage") or {}).get("prompt_tokens_details") or {}
+    return prompt_details.get("cached_tokens") or 0, 0
+
+
+class PromptCacheStats:
+    # run name of llm -> counters
+    stats = defaultdict(lambda: {"requests": 0, "hits": 0, "read_tokens": 0, "written_tokens": 0})
+    lock = threading.Lock()
+
+    @staticmethod
+    def record(llm, response):
+        read_tokens, written_tokens = cache_usage(response)
+        run_name = (getattr(llm, "config", None) or {}).get("run_name", "Clean Coder")
+        with PromptCacheStats.lock:
+            stats = PromptCacheStats.stats[run_name]
+            stats["requests"] += 1
+            stats["hits"] += 1 if read_tokens else 0
+            stats["read_tokens"] += read_tokens
+            stats["written_tokens"] += written_tokens
+
+    @staticmethod
+    def report():
+        for run_name, stats in PromptCacheStats.stats.items():
+            print_formatted(
+                f"Prompt cache of {run_name}: {stats['hits']} hits, {stats['requests'] - stats['hits']} misses; "
+                f"{stats['read_tokens']} tokens read from cache, {stats['written_tokens']} written to cache.",
+                color="dark_grey"
+            )
+
+
+atexit.register(PromptCacheStats.report)
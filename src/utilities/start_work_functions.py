@@ -2,7 +2,10 @@
 Place here functions that should be called when clean coder is started.
 """
 import os
+import re
+import time
 import fnmatch
+import threading
 from termcolor import colored
 from pathspec import PathSpec
 from pathspec.patterns import GitWildMatchPattern
@@ -15,33 +18,103 @@ def read_frontend_feedback_story():
 
 
 def file_folder_ignored(path):
-    path = path.rstrip('/')  # Remove trailing slash if present
-    spec = PathSpec.from_lines(GitWildMatchPattern, CoderIgnore.get_forbidden())
-    if spec.match_file(path):
-        return True
-    # old way of checking, to remove in future. For now still needed for checking exact folder matches
-    for pattern in CoderIgnore.get_forbidden():
-        pattern = pattern.rstrip('/')  # Remove trailing slash from pattern if present
-        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(f"{path}/", f"{pattern}/"):
-            return True
+    return CoderIgnore.is_ignored(path)
+
 
-    return False
+def walk_not_ignored(top, work_dir=None):
+    """
+    Works as os.walk, but does not descend into directories ignored in .coderignore and skips ignored files.
+    Yielded dirs list can be modified in place to prune walk further, as in os.walk. If top is subdirectory,
+    work_dir should be provided, as patterns are matched against paths relative to it.
+    """
+    work_dir = work_dir or top
+    for root, dirs, files in os.walk(top):
+        rel_root = os.path.relpath(root, work_dir)
+        prefix = "" if rel_root == "." else rel_root.replace(os.sep, "/") + "/"
+        dirs[:] = [d for d in dirs if not CoderIgnore.is_dir_ignored(prefix + d)]
+        kept_paths = set(CoderIgnore.filter_not_ignored([prefix + f for f in files]))
+        files = [f for f in files if prefix + f in kept_paths]
+        yield root, dirs, files
 
 
 class CoderIgnore:
-    forbidden_files_and_folders = None
+    """
+    Patterns of files and folders AI is not allowed to see. Patterns are compiled once and compiled again only
+    when .coderignore file changes. Read-only tools are run concurrently, so patterns and their compiled forms are
+    replaced together under lock, and every check uses one consistent version of them.
+    """
+    # (patterns, compiled spec, fnmatch regex or None); fnmatch is used for exact folder names (as 'venv' dir)
+    compiled = None
+    coderignore_mtime = None
+    last_mtime_check = 0
+    # seconds between checks of .coderignore modification
+    mtime_check_interval = 1
+    lock = threading.Lock()
+
+    @staticmethod
+    def coderignore_path():
+        return os.path.join(Work.dir(), '.clean_coder', '.coderignore')
 
     @staticmethod
     def read_coderignore():
-        coderignore_path = os.path.join(Work.dir(), '.clean_coder', '.coderignore')
-        with open(coderignore_path, 'r') as file:
+        with open(CoderIgnore.coderignore_path(), 'r') as file:
             return [line.strip() for line in file if line.strip() and not line.startswith('#')]
 
+    @staticmethod
+    def compile(patterns):
+        spec = PathSpec.from_lines(GitWildMatchPattern, patterns)
+        fnmatch_regex = re.compile(
+            "|".join(fnmatch.translate(pattern.rstrip('/')) for pattern in patterns)
+        ) if patterns else None
+        return patterns, spec, fnmatch_regex
+
+    @staticmethod
+    def refresh_if_changed():
+        """Returns current (patterns, spec, fnmatch regex), compiling them again if .coderignore changed."""
+        with CoderIgnore.lock:
+            now = time.monotonic()
+            if CoderIgnore.compiled is not None and \
+                    now - CoderIgnore.last_mtime_check < CoderIgnore.mtime_check_interval:
+                return CoderIgnore.compiled
+            CoderIgnore.last_mtime_check = now
+            mtime = os.path.getmtime(CoderIgnore.coderignore_path())
+            if CoderIgnore.compiled is not None and mtime == CoderIgnore.coderignore_mtime:
+                return CoderIgnore.compiled
+            CoderIgnore.compiled = CoderIgnore.compile(CoderIgnore.read_coderignore())
+            CoderIgnore.coderignore_mtime = mtime
+            return CoderIgnore.compiled
+
     @staticmethod
     def get_forbidden():
-        if CoderIgnore.forbidden_files_and_folders is None:
-            CoderIgnore.forbidden_files_and_folders = CoderIgnore.read_coderignore()
-        return CoderIgnore.forbidden_files_and_folders
+        patterns, _, _ = CoderIgnore.refresh_if_changed()
+        return patterns
+
+    @staticmethod
+    def is_ignored(path):
+        _, spec, fnmatch_regex = CoderIgnore.refresh_if_changed()
+        path = path.rstrip('/')  # Remove trailing slash if present
+        if spec.match_file(path):
+            return True
+        return bool(fnmatch_regex and fnmatch_regex.match(path))
+
+    @staticmethod
+    def is_dir_ignored(path):
+        """Directory patterns (ending with slash) match directory path only with slash at the end."""
+        _, spec, fnmatch_regex = CoderIgnore.refresh_if_changed()
+        path = path.rstrip('/')
+        return bool(
+            spec.match_file(path) or (fnmatch_regex and fnmatch_regex.match(path)) or spec.match_file(path + '/')
+        )
+
+    @staticmethod
+    def filter_not_ignored(paths):
+        """Returns paths not ignored in .coderignore, matching all of them against compiled patterns at once."""
+        _, spec, fnmatch_regex = CoderIgnore.refresh_if_changed()
+        paths = [path.rstrip('/') for path in paths]
+        ignored = set(spec.match_files(paths))
+        if fnmatch_regex:
+            ignored.update(path for path in paths if fnmatch_regex.match(path))
+        return [path for path in paths if path not in ignored]
 
 
 class Work:
@@ -1,7 +1,4 @@
 import ast
-import yaml
-import sass
-from lxml import etree
 import re
 from src.utilities.print_formatters import print_formatted
 
@@ -38,6 +35,8 @@ def parse_python(code):
 
 
 def parse_html(html_content):
+    # parser libraries are imported only when file of their type is checked
+    from lxml import etree
     parser = etree.HTMLParser(recover=True)  # Enable recovery mode
     try:
         html_tree = etree.fromstring(html_content, parser)
@@ -127,6 +126,7 @@ def check_bracket_balance(code):
 
 
 def parse_scss(scss_code):
+    import sass
     # removing import statements as they cousing error, because function has no access to filesystem
     scss_code = re.sub(r'@import\s+[\'"].*?[\'"];', '', scss_code)
     try:
@@ -206,6 +206,7 @@ def parse_tsx(tsx_code):
 
 
 def parse_yaml(yaml_string):
+    import yaml
     try:
         yaml.safe_load(yaml_string)
         return "Valid syntax"
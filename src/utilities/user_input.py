@@ -1,11 +1,16 @@
 import os
 from src.utilities.print_formatters import print_formatted
-from src.utilities.voice_utils import VoiceRecorder
-import keyboard
+from src.utilities.lazy import LazyObject
 import readline
 
 
-recorder = VoiceRecorder()
+def create_voice_recorder():
+    from src.utilities.voice_utils import VoiceRecorder
+    return VoiceRecorder()
+
+
+# recorder and its OpenAI client are created only when microphone is used
+recorder = LazyObject(create_voice_recorder)
 
 
 def user_input(prompt=""):
@@ -31,6 +36,7 @@ def user_input(prompt=""):
 
 
 def record_voice_message():
+    import keyboard
     recorder.start_recording()
     keyboard.wait('enter', suppress=True)
     recorder.stop_recording()
@@ -2,11 +2,14 @@ import re
 import os
 import xml.etree.ElementTree as ET
 import base64
+import difflib
 import requests
 from src.utilities.start_work_functions import file_folder_ignored, Work
+from src.utilities.file_cache import FileCache
+from src.utilities.project_tree import get_tree_snapshot, DEFAULT_TOKEN_BUDGET
 from src.utilities.print_formatters import print_formatted
+from src.utilities.objects import CodeFile
 from dotenv import load_dotenv, find_dotenv
-from todoist_api_python.api import TodoistAPI
 from langchain_core.messages import HumanMessage, ToolMessage
 import click
 
@@ -14,12 +17,13 @@ import click
 load_dotenv(find_dotenv())
 work_dir = os.getenv("WORK_DIR")
 log_file_path = os.getenv("LOG_FILE")
-todoist_api = TodoistAPI(os.getenv('TODOIST_API_KEY'))
 PROJECT_ID = os.getenv('TODOIST_PROJECT_ID')
 
 
 TOOL_NOT_EXECUTED_WORD = "Tool not been executed. "
 WRONG_TOOL_CALL_WORD = "Wrong tool call. "
+# files are shown again in full when their appended changes grow bigger than that part of full files message
+FILE_CHANGES_REBASE_RATIO = 0.5
 
 storyfile_template = """<This is the story of your project for a frontend feedback agent. Modify it according to commentaries provided in <> brackets.>
 
@@ -45,6 +49,12 @@ For being logged in as admin user, use username="frontend.feedback@admin", passw
 """
 
 
+def create_todoist_api():
+    # imported only when Todoist is really used
+    from todoist_api_python.api import TodoistAPI
+    return TodoistAPI(os.getenv('TODOIST_API_KEY'))
+
+
 def check_file_contents(files, work_dir, line_numbers=True):
     file_contents = f"Files shown: {[str(f) for f in files]}\n\n"
     for file_name in files:
@@ -58,20 +68,25 @@ def watch_file(filename, work_dir, line_numbers=True):
     if file_folder_ignored(filename):
         return "You are not allowed to work with this file."
     try:
-        with open(join_paths(work_dir, filename), 'r', encoding='utf-8') as file:
-            lines = file.readlines()
+        if line_numbers:
+            file_content = FileCache.render(join_paths(work_dir, filename), "numbered", render_numbered_lines)
+        else:
+            file_content = FileCache.render(join_paths(work_dir, filename), "plain", render_plain_lines)
     except FileNotFoundError:
         return "File not exists."
-    if line_numbers:
-        formatted_lines = [f"{i + 1}|{line.rstrip()} |{i+1}\n" for i, line in enumerate(lines)]
-    else:
-        formatted_lines = [f"{line.rstrip()}\n" for line in lines]
-    file_content = "".join(formatted_lines)
     file_content = filename + ":\n\n" + file_content
 
     return file_content
 
 
+def render_numbered_lines(lines, first_line=1):
+    return "".join(f"{i}|{line.rstrip()} |{i}\n" for i, line in enumerate(lines, first_line))
+
+
+def render_plain_lines(lines):
+    return "".join(f"{line.rstrip()}\n" for line in lines)
+
+
 def find_tool_xml(input_str):
     match = re.search('```xml(.*?)```', input_str, re.DOTALL)
     if match:
@@ -141,39 +156,13 @@ def get_joke():
     return joke
 
 
-def list_directory_tree(work_dir):
-    tree = []
-    for root, dirs, files in os.walk(work_dir):
-        # Filter out forbidden directories and files
-        dirs[:] = [d for d in dirs if not file_folder_ignored(d)]
-        files = [f for f in files if not file_folder_ignored(f)]
-        rel_path = os.path.relpath(root, work_dir)
-        depth = rel_path.count(os.sep)
-        indent = "│ " * depth
-
-        # Add current directory to the tree
-        tree.append(f"{indent}{'└──' if depth > 0 else ''}📁 {os.path.basename(root)}")
-
-        # Check if the total number of items exceeds the threshold
-        total_items = len(dirs) + len(files)
-        if total_items > 30:
-            file_indent = "│ " * (depth + 1)
-            tree.append(f"{file_indent}Too many files/folders to display ({total_items} items)")
-            dirs.clear()
-            continue
-        elif total_items == 0:
-            file_indent = "│ " * (depth + 1)
-            tree.append(f"{file_indent}<Directory is empty>")
-            dirs.clear()
-            continue
-
-        # Add files to the tree
-        file_indent = "│ " * (depth + 1)
-        for i, file in enumerate(files):
-            connector = "└── " if i == len(files) - 1 else "├── "
-            tree.append(f"{file_indent}{connector}{file}")
-
-    return "Content of directory tree:\n" + "\n".join(tree)
+def list_directory_tree(work_dir, task=None, token_budget=None):
+    """
+    Renders project tree fitting into token budget (PROJECT_TREE_TOKEN_BUDGET env variable by default), expanding
+    directories mentioned in task first. Tree is kept in memory and updated on file system changes.
+    """
+    token_budget = token_budget or int(os.getenv("PROJECT_TREE_TOKEN_BUDGET") or DEFAULT_TOKEN_BUDGET)
+    return get_tree_snapshot(work_dir).render(token_budget, task)
 
 
 def invoke_tool_native(tool_call, tools):
@@ -187,16 +176,118 @@ def invoke_tool_native(tool_call, tools):
 
 
 def exchange_file_contents(state, files, work_dir):
+    # in diff mode only changes are appended, keeping beginning of conversation unchanged
+    if diff_refresh_enabled() and append_file_changes(state, files, work_dir):
+        return state
     # Remove old one
-    state["messages"] = [msg for msg in state["messages"] if not hasattr(msg, "contains_file_contents")]
+    state["messages"] = [
+        msg for msg in state["messages"]
+        if not hasattr(msg, "contains_file_contents") and not hasattr(msg, "contains_file_changes")
+    ]
     # Add new file contents
     file_contents = check_file_contents(files, work_dir)
     file_contents = f"Find most actual file contents here:\n\n{file_contents}\nTake a look at line numbers before introducing changes."
-    file_contents_msg = HumanMessage(content=file_contents, contains_file_contents=True)
+    file_contents_msg = HumanMessage(
+        content=file_contents, contains_file_contents=True, **file_snapshot_attributes(files, work_dir)
+    )
     state["messages"].insert(2, file_contents_msg)  # insert after the system and plan msgs
     return state
 
 
+def append_file_changes(state, files, work_dir):
+    """
+    Appends message with changes of files since their last version shown to agent. Returns False if files need to
+    be shown again in full instead - when there is no previous version or changes grew too big compared to files.
+    """
+    snapshot_msgs = [msg for msg in state["messages"] if hasattr(msg, "file_snapshot")]
+    file_contents_msgs = [msg for msg in state["messages"] if hasattr(msg, "contains_file_contents")]
+    if not snapshot_msgs or not file_contents_msgs:
+        return False
+    new_snapshot = snapshot_files(files, work_dir)
+    changes = describe_file_changes(snapshot_msgs[-1].file_snapshot, new_snapshot)
+    if not changes:
+        return True
+    changes_size = len(changes) + sum(
+        len(msg.content) for msg in state["messages"] if hasattr(msg, "contains_file_changes")
+    )
+    if changes_size > len(file_contents_msgs[0].content) * FILE_CHANGES_REBASE_RATIO:
+        return False
+    changes_msg = HumanMessage(
+        content=f"Files changed since you seen them:\n\n{changes}\n\nLine numbers above are actual ones.",
+        contains_file_changes=True,
+        file_snapshot=new_snapshot,
+    )
+    state["messages"].append(changes_msg)
+    return True
+
+
+def diff_refresh_enabled():
+    return os.getenv("FILE_CONTEXT_REFRESH") == "diff"
+
+
+def file_snapshot_attributes(files, work_dir):
+    """Snapshot of files to attach to file contents message; only diff mode needs it to find changes later."""
+    return {"file_snapshot": snapshot_files(files, work_dir)} if diff_refresh_enabled() else {}
+
+
+def snapshot_files(files, work_dir):
+    """Filename -> lines of file, or None if file not exists or is ignored."""
+    snapshot = {}
+    for file in files:
+        try:
+            ignored = file_folder_ignored(file.filename)
+            snapshot[file.filename] = None if ignored else FileCache.read_lines(join_paths(work_dir, file.filename))
+        except FileNotFoundError:
+            snapshot[file.filename] = None
+    return snapshot
+
+
+def describe_file_changes(old_snapshot, new_snapshot):
+    """Describes changed line ranges of files with new line numbers."""
+    file_changes = []
+    for filename, new_lines in new_snapshot.items():
+        old_lines = old_snapshot.get(filename)
+        if new_lines == old_lines:
+            continue
+        if new_lines is None:
+            file_changes.append(f"{filename}: File not exists.")
+            continue
+        if old_lines is None:
+            file_changes.append(f"{filename} (new file):\n\n{render_numbered_lines(new_lines)}")
+            continue
+        hunks = []
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            if tag == "delete":
+                hunk = f"Old lines {old_start + 1}-{old_end} removed."
+            elif tag == "insert":
+                hunk = f"Lines {new_start + 1}-{new_end} inserted after old line {old_start}:"
+            else:
+                hunk = f"Old lines {old_start + 1}-{old_end} replaced with lines {new_start + 1}-{new_end}:"
+            shift = (new_end - new_start) - (old_end - old_start)
+            if shift:
+                hunk += f" (next lines moved by {shift:+d})"
+            if new_end > new_start:
+                hunk += "\n" + render_numbered_lines(new_lines[new_start:new_end], first_line=new_start + 1)
+            hunks.append(hunk)
+        file_changes.append(f"{filename}:\n\n" + "\n".join(hunks))
+    return "\n\n###\n\n".join(file_changes)
+
+
+def track_file_changes(files, messages):
+    """Adds files created by tool calls of AI messages to files set and marks files edited by them as modified."""
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            filename = tool_call["args"].get("filename")
+            file = next((file for file in files if file.filename == filename), None)
+            if tool_call["name"] == "create_file_with_code" and not file:
+                files.add(CodeFile(filename, is_modified=True))
+            elif tool_call["name"] in ["replace_code", "insert_code", "create_file_with_code"] and file:
+                file.is_modified = True
+
+
 def bad_tool_call_looped(state):
     last_tool_messages = [m for m in state["messages"] if m.type == "tool"][-4:]
     tool_not_executed_msgs = [